@@ -0,0 +1,48 @@
+"""
+Compares encode/decode throughput of the dataclasses_json + ujson path against each link codec.
+
+Usage: python bench/link_codec.py [count]
+"""
+import sys
+import time
+import ujson
+
+from mudgate.codec import CODECS, FRAME_CONNECTION
+from mudgate.shared import ConnectionDetails, ConnectionInMessage, ConnectionInMessageType
+from mudgate.shared import ConnectionOutMessage, ConnectionOutMessageType
+
+
+def benchmark(count: int = 20000):
+    details = ConnectionDetails(client_id="telnet_benchmark", connected=time.time(), width=120, mxp=True)
+    line = ConnectionInMessage(ConnectionInMessageType.GAMEDATA, "telnet_benchmark", (("line", ("look",), dict()),))
+    update = ConnectionInMessage(ConnectionInMessageType.UPDATE, "telnet_benchmark", details)
+    out = ConnectionOutMessage(ConnectionOutMessageType.GAMEDATA, "telnet_benchmark", {
+        "processor": "xml", "body": [{"data": "<text>You see a <span color=\"red\">goblin</span>.</text>",
+                                      "mode": "line"}]})
+
+    def timed(label, func):
+        start = time.perf_counter()
+        for i in range(count):
+            func()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<40} {count / elapsed:>12,.0f} msg/s")
+
+    print(f"{count} iterations each:")
+    timed("dataclasses_json encode line", lambda: ujson.dumps(line.to_dict()))
+    timed("dataclasses_json encode update", lambda: ujson.dumps(update.to_dict()))
+    out_text = ujson.dumps(out.to_dict())
+    timed("dataclasses_json decode gamedata", lambda: ConnectionOutMessage.from_dict(ujson.loads(out_text)))
+
+    for codec in CODECS.values():
+        timed(f"{codec.name} encode line", lambda: codec.encode_event(line))
+        timed(f"{codec.name} encode update", lambda: codec.encode_event(update))
+        if codec.binary:
+            out_data = codec.packer.pack((FRAME_CONNECTION, int(out.msg_type), out.client_id, out.data))
+        else:
+            out_data = out_text
+        timed(f"{codec.name} decode gamedata", lambda: codec.decode(out_data))
+        print(f"{codec.name + ' update size':<40} {len(codec.encode_event(update)):>12} bytes")
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:2]))
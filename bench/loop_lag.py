@@ -0,0 +1,81 @@
+"""
+Sends outputs of a few hundred KB over MCCP2 while a ticker measures how late the event loop
+wakes it, first compressing inline and then through the executor.
+
+Usage: python bench/loop_lag.py [size] [count] [workers]
+"""
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mudgate.shared import ConnectionDetails
+from mudgate.telnet import TelnetMudConnection
+
+
+class _Transport:
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return False
+
+
+class _Listener:
+    def __init__(self, threshold: int, workers: int):
+        self.mccp2 = {"level": 9}
+        self.compress_threshold = threshold
+        self.compress_executor = ThreadPoolExecutor(max_workers=workers) if threshold else None
+        self.out_high = 262144
+        self.read_size = 16384
+
+
+def benchmark(size: int = 262144, count: int = 20, workers: int = 2):
+    rng = random.Random(0)
+    words = ("goblin", "sword", "north", "forest", "gold", "the", "ancient", "door", "Level", "Player")
+    body = "\n".join(" ".join(rng.choice(words) for _ in range(12)) for _ in range(size // 70))
+
+    async def measure(threshold):
+        listener = _Listener(threshold, workers)
+        conn = TelnetMudConnection(listener, ConnectionDetails(client_id="benchmark"))
+        conn.transport = _Transport()
+        conn.telnet.out_compressor = conn.telnet.make_compressor()
+        lags = list()
+        done = False
+
+        async def ticker():
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        for i in range(count):
+            await conn.send_text_data("line", body)
+            await asyncio.sleep(0)
+        conn.flush_output()
+        while conn.compress_task:
+            await conn.compress_task
+        elapsed = time.perf_counter() - start
+        done = True
+        await tick
+        lags.sort()
+        print(f"{'executor' if threshold else 'inline':<8}: {elapsed * 1000:8.1f} ms total, "
+              f"loop lag p50 {lags[len(lags) // 2] * 1000:6.2f} ms, max {lags[-1] * 1000:6.2f} ms, "
+              f"{conn.transport.written} bytes written")
+
+    print(f"{count} outputs of {len(body)} bytes:")
+    asyncio.run(measure(0))
+    asyncio.run(measure(16384))
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,49 @@
+"""
+Compresses a stream of typical MUD output one line at a time, with a sync flush per line
+like TelnetConnection.send_bytes does, and prints the CPU time and bytes on the wire for
+each MCCP2 setting.
+
+Usage: python bench/mccp2.py [lines]
+"""
+import random
+import sys
+import time
+import zlib
+
+from mudgate.telnet_protocol import mccp2_memory
+
+
+def benchmark(lines: int = 5000):
+    rng = random.Random(0)
+    words = ("the", "a", "goblin", "sword", "north", "dark", "forest", "You", "see", "attacks", "with",
+             "his", "her", "glowing", "ancient", "is", "here", "gold", "coins", "door", "east", "west")
+    colors = (b"\x1b[31m", b"\x1b[1;32m", b"\x1b[33m", b"\x1b[38;5;208m", b"\x1b[0m")
+    out = list()
+    for i in range(lines):
+        kind = i % 10
+        if kind == 0:
+            out.append(b"\x1b[1;36m[ Exits: north east south ]\x1b[0m\r\n")
+        elif kind == 1:
+            out.append(f"<{rng.randint(50, 500)}hp {rng.randint(10, 300)}m {rng.randint(20, 200)}mv> ".encode())
+        elif kind < 5:
+            out.append(rng.choice(colors) + f"[{i:5}] Player{rng.randint(1, 300):<12} Level {rng.randint(1, 50)}".encode()
+                       + b"\x1b[0m\r\n")
+        else:
+            out.append(" ".join(rng.choice(words) for _ in range(rng.randint(6, 14))).encode() + b".\r\n")
+    raw = sum(len(l) for l in out)
+
+    print(f"{lines} lines, {raw} bytes uncompressed:")
+    profiles = [(level, 15, 8) for level in (1, 3, 6, 9)] + [(6, 12, 5), (6, 10, 3), (1, 10, 3)]
+    for level, wbits, memlevel in profiles:
+        comp = zlib.compressobj(level, zlib.DEFLATED, wbits, memlevel)
+        start = time.process_time()
+        wire = 0
+        for line in out:
+            wire += len(comp.compress(line) + comp.flush(zlib.Z_SYNC_FLUSH))
+        elapsed = time.process_time() - start
+        print(f"level {level} wbits {wbits:>2} memlevel {memlevel} ({mccp2_memory(wbits, memlevel) // 1024:>3} KB): "
+              f"{elapsed * 1000:8.2f} ms CPU, {wire:>8} bytes ({wire * 100 / raw:5.1f}%)")
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,96 @@
+"""
+Has clients in another process connect to a TelnetManager on localhost and paste lines of
+text all at once, then times how long it takes for every line to reach the link's inbox.
+
+Usage: python bench/paste.py [clients] [lines] [chunk] [width]
+"""
+import asyncio
+import multiprocessing
+import socket
+import sys
+import time
+
+from mudgate.shared import ConnectionInMessage, ConnectionInMessageType
+from mudgate.telnet import TelnetManager
+
+
+class _Link:
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.up = True
+
+    def put(self, msg: ConnectionInMessage):
+        self.inbox.put_nowait(msg)
+
+    def route(self, client_id: str):
+        return self
+
+
+class _App:
+    def __init__(self):
+        self.game_clients = dict()
+        self.link = _Link()
+        self.tls_context = None
+        self.workers = 1
+        self.counter = 0
+
+    def generate_id(self, prefix: str):
+        self.counter += 1
+        return f"{prefix}_{self.counter}"
+
+
+def paste_clients(port: int, clients: int, paste: bytes, chunk: int, go):
+    socks = [socket.create_connection(("127.0.0.1", port)) for _ in range(clients)]
+    go.wait()
+    for i in range(0, len(paste), chunk):
+        for sock in socks:
+            sock.sendall(paste[i:i + chunk])
+    go.clear()
+    go.wait()
+    for sock in socks:
+        sock.close()
+
+
+def benchmark(clients: int = 200, lines: int = 2000, chunk: int = 16384, width: int = 50):
+    paste = b"".join(f"say line {i:<5} {'x' * (width - 16)}\r\n".encode() for i in range(lines))
+
+    async def main():
+        app = _App()
+        manager = TelnetManager(app, "127.0.0.1", 0, None)
+        await manager.setup()
+        await manager.server_plain.start_serving()
+        port = manager.server_plain.sockets[0].getsockname()[1]
+        go = multiprocessing.Event()
+        proc = multiprocessing.Process(target=paste_clients, args=(port, clients, paste, chunk, go))
+        proc.start()
+        while len(app.game_clients) < clients or not all(c.started for c in app.game_clients.values()):
+            await asyncio.sleep(0.05)
+        inbox = app.link.inbox
+        while not inbox.empty():
+            inbox.get_nowait()
+
+        expected = clients * lines
+        received = 0
+        start = time.perf_counter()
+        cpu = time.process_time()
+        go.set()
+        while received < expected:
+            if (await inbox.get()).msg_type == ConnectionInMessageType.GAMEDATA:
+                received += 1
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        print(f"{clients} clients x {lines} lines ({len(paste) * clients} bytes): {elapsed * 1000:.1f} ms, "
+              f"{cpu * 1000:.1f} ms CPU, {expected / elapsed:,.0f} lines/s, "
+              f"{len(paste) * clients / elapsed / 1048576:.1f} MB/s")
+
+        go.set()
+        proc.join()
+        manager.server_plain.close()
+        for conn in list(app.game_clients.values()):
+            conn.task.cancel()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:5]))
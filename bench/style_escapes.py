@@ -0,0 +1,55 @@
+"""
+Times rendering the segments of a typical colored room description with and without
+MudStyle's escape cache.
+
+Usage: python bench/style_escapes.py [count]
+"""
+import os
+import sys
+import time
+
+from mudgate import rich as mudrich
+
+mudrich.install()
+
+from rich.color import ColorSystem
+from rich.console import Console
+from rich.style import Style
+from rich.text import Text
+
+
+def benchmark(count: int = 2000):
+    c = Console(color_system="256", mxp=True, record=True, file=open(os.devnull, "w"))
+    room = Text("The Market Square", style=Style(color="bright_white", bold=True))
+    room.append("\nStalls crowd the square, their awnings ")
+    room.append("red", style=Style(color="red"))
+    room.append(" and ")
+    room.append("gold", style=Style(color="yellow", bold=True))
+    room.append(" in the afternoon sun. A ")
+    room.append("merchant", style=Style(color="cyan", tag="SEND", xml_attr={"href": "look merchant"}))
+    room.append(" calls out his wares.\nExits: ")
+    for exit_name in ("north", "east", "south", "west"):
+        room.append(exit_name, style=Style(color="green", tag="SEND", xml_attr={"href": exit_name}))
+        room.append(" ")
+    segments = [(text, style) for text, style, control in c.render(room) if style]
+
+    def timed(label, cache_size):
+        mudrich.MudStyle.escape_cache_size = cache_size
+        mudrich._ESCAPE_CACHE.clear()
+        start = time.perf_counter()
+        for i in range(count):
+            for text, style in segments:
+                style.render(text, color_system=ColorSystem.EIGHT_BIT, mxp=True)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<10} {count * len(segments) / elapsed:>12,.0f} segments/s")
+
+    old_size = mudrich.MudStyle.escape_cache_size
+    try:
+        timed("uncached", 0)
+        timed("cached", old_size)
+    finally:
+        mudrich.MudStyle.escape_cache_size = old_size
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:2]))
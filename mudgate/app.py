@@ -1,12 +1,12 @@
 import ssl
-import uuid
+import time
 import asyncio
-import random
-import string
 
-from typing import List, Optional, Dict
+from typing import Optional, Dict
 from .telnet import TelnetManager
-from .link import LinkManager
+from .link import LinkChannel, LinkManager, LinkState
+from .conn import MudConnection
+from .utils import IdGenerator
 
 
 class MudGate:
@@ -14,9 +14,13 @@ class MudGate:
     The core of MudGate.
     """
 
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, worker: int = 0, workers: int = 1):
         self.name = config.get("name", "mudgate")
         self.config = config
+        # when running as one of several worker processes, this one's index and the total.
+        self.worker = worker
+        self.workers = workers
+        self.ids = IdGenerator(worker)
         self.configured = False
         self.tls_context: Optional[ssl.SSLContext] = None
         self.game_clients: Dict[str] = dict()
@@ -26,6 +30,11 @@ class MudGate:
         self.ssh = None
         self.web = None
         self.running_services = list()
+        # seconds between reminders to a client that sends input while the link is down. 0 disables.
+        self.link_reminder = config.get("link_notice", dict()).get("reminder", 30)
+        # seconds between telling a client that some of its input was dropped. 0 tells it every time.
+        self.input_reminder = config.get("link_notice", dict()).get("dropped", 5)
+        self.notices = set()
 
     async def configure(self):
 
@@ -41,35 +50,89 @@ class MudGate:
             tel_plain = tel.get("plain", None)
             tel_tls = tel.get("tls", None)
             if tel_plain or tel_tls:
-                self.telnet = TelnetManager(self, interfaces["external"], tel_plain, tel_tls)
+                mccp2 = dict(tel.get("mccp2", dict()))
+                offload_threshold = mccp2.pop("offload_threshold", 0)
+                offload_workers = mccp2.pop("offload_workers", 0)
+                self.telnet = TelnetManager(self, interfaces["external"], tel_plain, tel_tls, mccp2=mccp2,
+                                            compress_threshold=offload_threshold, compress_workers=offload_workers,
+                                            backpressure=tel.get("backpressure", None),
+                                            read_size=tel.get("read_size", 16384), read_max=tel.get("read_max", 262144),
+                                            read_shrink=tel.get("read_shrink", 16))
                 await self.telnet.setup()
                 self.running_services.append(self.telnet.run())
 
-        self.link = LinkManager(self, interfaces["internal"], self.config.get("link", 7000))
+        batch = self.config.get("link_batch", dict())
+        replay = self.config.get("link_replay", dict())
+        inbox = self.config.get("link_inbox", dict())
+        self.link = LinkManager(self, interfaces["internal"], self.config.get("link", 7000) + self.worker,
+                                batch_count=batch.get("count", 100), batch_size=batch.get("size", 65536),
+                                batch_window=batch.get("window", 500), replay_frames=replay.get("frames", 1000),
+                                hello_timeout=replay.get("timeout", 5.0), inbox_size=inbox.get("size", 10000),
+                                inbox_client_cap=inbox.get("client", 100), inbox_control_cap=inbox.get("control", 10000),
+                                hello_chunk=self.config.get("link_hello_chunk", 500),
+                                link_names=self.config.get("link_names", None))
         self.running_services.append(self.link.run())
 
-
-        self.running_services.append(self.please_wait_warmly())
+        MudConnection.render_cache.max_entries = self.config.get("render_cache", 1024)
 
         self.configured = True
 
-    def generate_id(self, prefix: str):
-
-        def gen():
-            return f"{prefix}_{''.join(random.choices(string.ascii_letters + string.digits, k=20))}"
-
-        while (u := gen()) not in self.game_clients:
-            return u
+    def generate_id(self, prefix: str) -> str:
+        """
+        Returns a new client ID. Shared by every listener.
+        """
+        return self.ids.generate(prefix)
 
     async def run(self):
+        loop = asyncio.get_running_loop()
+        worker = f"worker {self.worker}: " if self.workers > 1 else ""
+        print(f"{worker}event loop: {type(loop).__module__}.{type(loop).__qualname__}, debug={loop.get_debug()}")
         await self.configure()
 
         await asyncio.gather(*self.running_services)
 
-    async def please_wait_warmly(self):
-        msg = f"No connection to {self.name}. Please standby..."
-        while True:
-            if not self.link.link:
-                for k, v in self.game_clients.items():
-                    await v.send_text_data(mode="line", data=msg)
-            await asyncio.sleep(3)
\ No newline at end of file
+    def send_notice(self, clients, text: str):
+        """
+        Sends a line of text to every started client in clients at once, without waiting on them.
+        """
+        if not (sends := [c.send_text_data(mode="line", data=text) for c in clients if c.started]):
+            return
+        notice = asyncio.gather(*sends, return_exceptions=True)
+        self.notices.add(notice)
+        notice.add_done_callback(self.notices.discard)
+
+    def on_link_state(self, channel: LinkChannel, old: LinkState, new: LinkState):
+        if new == LinkState.DISCONNECTED:
+            text = f"Lost connection to {self.name}. Please standby..."
+        elif new == LinkState.RESUMED:
+            text = f"Connection to {self.name} restored."
+        else:
+            text = f"Connected to {self.name}."
+        now = time.monotonic()
+        route = self.link.route
+        clients = [c for c in self.game_clients.values() if c.started and route(c.conn_id) is channel]
+        for client in clients:
+            client.link_notice_at = now
+        self.send_notice(clients, text)
+
+    def remind_link_down(self, client):
+        """
+        Tells a client the link is down, unless it was told less than link_reminder seconds ago.
+        """
+        now = time.monotonic()
+        if client.link_notice_at and (not self.link_reminder or now - client.link_notice_at < self.link_reminder):
+            return
+        client.link_notice_at = now
+        self.send_notice((client,), f"No connection to {self.name}. Please standby...")
+
+    def on_input_dropped(self, client):
+        """
+        Counts input the link's inbox refused from a client, and tells the client about it unless
+        it was told less than input_reminder seconds ago.
+        """
+        client.input_dropped += 1
+        now = time.monotonic()
+        if client.input_notice_at and now - client.input_notice_at < self.input_reminder:
+            return
+        client.input_notice_at = now
+        self.send_notice((client,), "You're sending input faster than it can be handled. Some of it was dropped.")
\ No newline at end of file
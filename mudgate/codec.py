@@ -0,0 +1,171 @@
+"""
+Codecs for messages sent over the link between MudGate and the game server.
+
+The JSON codec is always available and is what every link starts out using. If msgpack is
+installed, a compact binary codec is also offered in the HELLO message, and the game server
+may switch to it by answering with a HELLO of its own naming the codec it wants.
+"""
+import ujson
+
+from dataclasses import fields
+from typing import Dict, List, Union
+
+from .shared import (
+    ConnectionDetails,
+    ConnectionInMessage,
+    ConnectionOutMessage,
+    ConnectionOutMessageType,
+    LinkMessage,
+    LinkMessageType,
+)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+DETAILS_FIELDS = tuple(f.name for f in fields(ConnectionDetails))
+
+# binary frames are arrays that start with one of these, so they can be told apart.
+FRAME_LINK = 0
+FRAME_CONNECTION = 1
+
+
+def details_to_dict(details: ConnectionDetails) -> dict:
+    return {name: getattr(details, name) for name in DETAILS_FIELDS}
+
+
+def details_from_dict(data: dict) -> ConnectionDetails:
+    return ConnectionDetails(**data)
+
+
+class LinkCodec:
+    name = None
+    binary = False
+
+    def encode_details(self, details: ConnectionDetails):
+        return details_to_dict(details)
+
+    def decode_details(self, data) -> ConnectionDetails:
+        return details_from_dict(data)
+
+    def encode_event(self, msg: ConnectionInMessage):
+        """
+        Encodes a single ConnectionInMessage as a fragment for encode_events.
+        """
+        raise NotImplementedError()
+
+    def encode_events(self, process_id: int, events: List, seq: int = 0):
+        """
+        Wraps a list of fragments from encode_event in a LinkMessage EVENTS frame, numbered seq.
+        """
+        raise NotImplementedError()
+
+    def encode_link(self, msg: LinkMessage):
+        raise NotImplementedError()
+
+    def decode(self, data) -> Union[LinkMessage, ConnectionOutMessage]:
+        raise NotImplementedError()
+
+    def decode_out_message(self, data) -> ConnectionOutMessage:
+        """
+        Decodes one of the entries of a decoded EVENTS frame.
+        """
+        raise NotImplementedError()
+
+    def _in_data(self, msg: ConnectionInMessage):
+        if isinstance(msg.data, ConnectionDetails):
+            return self.encode_details(msg.data)
+        return msg.data
+
+
+class JSONCodec(LinkCodec):
+    name = "json"
+
+    def encode_event(self, msg: ConnectionInMessage) -> str:
+        return ujson.dumps(
+            {"msg_type": int(msg.msg_type), "client_id": msg.client_id, "data": self._in_data(msg)}
+        )
+
+    def encode_events(self, process_id: int, events: List[str], seq: int = 0) -> str:
+        return f'{{"msg_type":{int(LinkMessageType.EVENTS)},"process_id":{process_id},"seq":{seq},' \
+               f'"data":[{",".join(events)}]}}'
+
+    def encode_link(self, msg: LinkMessage) -> str:
+        return ujson.dumps(
+            {"msg_type": int(msg.msg_type), "process_id": msg.process_id, "data": msg.data}
+        )
+
+    def decode(self, data: Union[str, bytes]) -> Union[LinkMessage, ConnectionOutMessage]:
+        js = ujson.loads(data)
+        if "client_id" in js:
+            return self.decode_out_message(js)
+        return LinkMessage(LinkMessageType(js["msg_type"]), js["process_id"], js.get("data", None))
+
+    def decode_out_message(self, data: dict) -> ConnectionOutMessage:
+        return ConnectionOutMessage(
+            ConnectionOutMessageType(data["msg_type"]), data["client_id"], data.get("data", None)
+        )
+
+
+class MsgpackCodec(LinkCodec):
+    """
+    Frames are msgpack arrays of [frame kind, msg_type, process_id or client_id, data].
+    EVENTS frames sent to the game server have their seq appended as a fifth element.
+    ConnectionDetails are sent as arrays of their field values, in DETAILS_FIELDS order.
+    """
+
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        self.packer = msgpack.Packer()
+
+    def encode_details(self, details: ConnectionDetails) -> list:
+        return [getattr(details, name) for name in DETAILS_FIELDS]
+
+    def decode_details(self, data: list) -> ConnectionDetails:
+        return ConnectionDetails(*data)
+
+    def encode_event(self, msg: ConnectionInMessage) -> bytes:
+        return self.packer.pack(
+            (FRAME_CONNECTION, int(msg.msg_type), msg.client_id, self._in_data(msg))
+        )
+
+    def encode_events(self, process_id: int, events: List[bytes], seq: int = 0) -> bytes:
+        pack = self.packer.pack
+        return b"".join(
+            (
+                self.packer.pack_array_header(5),
+                pack(FRAME_LINK),
+                pack(int(LinkMessageType.EVENTS)),
+                pack(process_id),
+                self.packer.pack_array_header(len(events)),
+                *events,
+                pack(seq),
+            )
+        )
+
+    def encode_link(self, msg: LinkMessage) -> bytes:
+        return self.packer.pack((FRAME_LINK, int(msg.msg_type), msg.process_id, msg.data))
+
+    def decode(self, data: bytes) -> Union[LinkMessage, ConnectionOutMessage]:
+        unpacked = msgpack.unpackb(data)
+        if unpacked[0] == FRAME_CONNECTION:
+            return self.decode_out_message(unpacked)
+        kind, msg_type, process_id, body = unpacked[:4]
+        return LinkMessage(LinkMessageType(msg_type), process_id, body)
+
+    def decode_out_message(self, data: list) -> ConnectionOutMessage:
+        kind, msg_type, client_id, body = data
+        return ConnectionOutMessage(ConnectionOutMessageType(msg_type), client_id, body)
+
+
+JSON_CODEC = JSONCodec()
+
+CODECS: Dict[str, LinkCodec] = {JSON_CODEC.name: JSON_CODEC}
+
+if msgpack:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
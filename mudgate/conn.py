@@ -1,7 +1,7 @@
-import random
-import string
+import asyncio
 import time
-from typing import List
+from collections import OrderedDict, deque
+from typing import List, Optional
 from .shared import (
     ConnectionDetails,
     ConnectionInMessageType,
@@ -55,8 +55,47 @@ class StyleOptions(IntEnum):
     OVERLINE = 4096
 
 
+class RenderCache:
+    """
+    A size-bounded LRU cache of rendered gamedata, shared by every connection. Keys combine
+    the raw body with the console capabilities that affect how it renders, so a broadcast
+    only needs to be rendered once per distinct capability profile.
+    """
+
+    __slots__ = ["max_entries", "entries", "hits", "misses"]
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key) -> Optional[str]:
+        found = self.entries.get(key, None)
+        if found is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return found
+
+    def set(self, key, value: str):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
 class MudConnection:
     listener = None
+    render_cache = RenderCache()
 
     def __init__(self, details: ConnectionDetails):
         details.connected = time.time()
@@ -64,9 +103,15 @@ class MudConnection:
         self.started: bool = False
         self.ended: bool = False
         self.details = details
-        self.in_events = list()
+        self.in_events = deque()
+        self.in_events_ready = asyncio.Event()
         self.console = Console(color_system=None, file=self, record=True)
         self.server_data = None
+        # when this connection was last told about the link to the game server going down or up.
+        self.link_notice_at: float = 0.0
+        # how much of this connection's input the link refused, and when it was last told so.
+        self.input_dropped: int = 0
+        self.input_notice_at: float = 0.0
 
     @property
     def conn_id(self):
@@ -88,14 +133,6 @@ class MudConnection:
     def do_print(self):
         return self.console.export_text(clear=True, styles=True)
 
-    def generate_name(self) -> str:
-        prefix = f"{self.listener.name}_"
-
-        attempt = f"{prefix}{''.join(random.choices(string.ascii_letters + string.digits, k=20))}"
-        while attempt in self.listener.service.mudconnections:
-            attempt = f"{prefix}{''.join(random.choices(string.ascii_letters + string.digits, k=20))}"
-        return attempt
-
     async def process_out_event(self, ev: ConnectionOutMessage):
         if ev.msg_type == ConnectionOutMessageType.GAMEDATA:
             await self.process_out_gamedata(ev)
@@ -114,13 +151,34 @@ class MudConnection:
     async def process_out_disconnect(self, ev: ConnectionOutMessage):
         pass
 
+    def queue_in_event(self, msg: ConnectionInMessage):
+        self.in_events.append(msg)
+        self.in_events_ready.set()
+        if msg.msg_type == ConnectionInMessageType.GAMEDATA and not self.listener.app.link.route(self.conn_id).up:
+            self.listener.app.remind_link_down(self)
+
+    async def run_in_events(self):
+        """
+        Hands queued in_events to the link as soon as they're queued. Sleeps while there is
+        nothing to send, and exits once the connection stops running and the queue is empty.
+        """
+        put = self.listener.app.link.put
+        while self.running or self.in_events:
+            while self.in_events:
+                put(self.in_events.popleft())
+            if self.running:
+                self.in_events_ready.clear()
+                await self.in_events_ready.wait()
+
     def on_start(self):
         self.started = True
-        self.in_events.append(
+        self.queue_in_event(
             ConnectionInMessage(
                 ConnectionInMessageType.READY, self.conn_id, self.details
             )
         )
+        if not self.listener.app.link.route(self.conn_id).up:
+            self.listener.app.remind_link_down(self)
 
     def check_ready(self):
         pass
@@ -128,8 +186,95 @@ class MudConnection:
     async def process_xml(self, body):
         for entry in body:
             mode = entry.get("mode", "line")
-            rendered = self.print_xml(entry["data"])
-            await self.send_text_data(mode.lower(), self.print(rendered))
+            await self.send_text_data(mode.lower(), self.render_xml(entry["data"]))
+
+    def render_key(self, data: str) -> tuple:
+        console = self.console
+        return data, console._color_system, console._width, console._mxp, console._pueblo
+
+    def render_xml(self, data: str) -> str:
+        """
+        Renders an XML gamedata entry to text for this connection, re-using the output of
+        any other connection that rendered the same entry with the same capabilities.
+        """
+        key = self.render_key(data)
+        rendered = self.render_cache.get(key)
+        if rendered is None:
+            tree = ElementTree.fromstring(data)
+            rendered = self.render_xml_fast(tree)
+            if rendered is None:
+                rendered = self.print(self.render_xml_element(tree))
+            self.render_cache.set(key, rendered)
+        return rendered
+
+    def render_xml_fast(self, element) -> Optional[str]:
+        """
+        Renders a simple <text> document straight to a string, skipping Rich's layout machinery.
+        The output is the same as printing render_xml_text()'s result.
+
+        Returns None if the document needs Rich: nested elements, anything that would wrap, or
+        text that isn't printable ASCII (tabs, newlines, control codes, wide characters).
+        """
+        if element.tag.lower() != "text" or element.text is None:
+            return None
+        parts = [element.text]
+        spans = list()
+        offset = len(element.text)
+        for e in element:
+            if len(e) or e.text is None:
+                return None
+            if e.text:
+                if (style := self.extract_style(e)) is not None:
+                    spans.append((offset, offset + len(e.text), style))
+                parts.append(e.text)
+                offset += len(e.text)
+            if e.tail:
+                parts.append(e.tail)
+                offset += len(e.tail)
+        if element.tail:
+            parts.append(element.tail)
+            offset += len(element.tail)
+
+        plain = "".join(parts)
+        if offset > self.console.width or not (plain.isascii() and plain.isprintable()):
+            return None
+
+        base = self.extract_style(element)
+        bounds = {0, offset}
+        for start, end, style in spans:
+            bounds.add(start)
+            bounds.add(end)
+        bounds = sorted(bounds)
+
+        out = list()
+        for start, end in zip(bounds, bounds[1:]):
+            active = tuple(style for s_start, s_end, style in spans if s_start <= start < s_end)
+            prefix, suffix = self.style_escapes(base, active)
+            out.append(f"{prefix}{plain[start:end]}{suffix}")
+        out.append("\n")
+        return "".join(out)
+
+    def style_escapes(self, base, active: tuple) -> tuple:
+        """
+        Returns the (prefix, suffix) strings that the combination of base and active styles
+        wraps text in for this connection's console. The strings themselves are cached by
+        MudStyle.escapes.
+        """
+        console = self.console
+        style = Style.null()
+        if base:
+            style = style + base
+        for span_style in active:
+            style = style + span_style
+        if not style:
+            return "", ""
+        return style.escapes(
+            color_system=console._color_system,
+            legacy_windows=console.legacy_windows,
+            mxp=console._mxp,
+            pueblo=console._pueblo,
+            links=console._links,
+        )
 
     async def send_text_data(self, mode: str, data: str):
         pass
@@ -170,7 +315,9 @@ class MudConnection:
         return Style(**kwargs)
 
     def print_xml(self, entry):
-        tree = ElementTree.fromstring(entry)
+        return self.render_xml_element(ElementTree.fromstring(entry))
+
+    def render_xml_element(self, tree):
         if tree.tag.lower() == "text":
             return self.render_xml_text(tree)
 
@@ -1,58 +1,561 @@
 import asyncio
+import logging
 import os
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
 from websockets import server
-import ujson
+from websockets.exceptions import ConnectionClosed
+from typing import Dict, Iterator, List, Optional, Set, Union
+
+from .shared import LinkMessage, LinkMessageType, ConnectionInMessage, ConnectionOutMessage, ConnectionOutMessageType
+from .shared import ConnectionInMessageType
+from .codec import CODECS, JSON_CODEC, LinkCodec, details_to_dict
+
+logger = logging.getLogger(__name__)
+
+# what a malformed message from the game server raises while it's decoded or handled.
+MALFORMED = (KeyError, IndexError, TypeError, ValueError, AttributeError)
+
+class InboxStats:
+    """
+    Metrics for a LinkInbox. Latency is the time messages spent waiting, in seconds.
+    """
+
+    __slots__ = ["queued", "sent", "overflowed", "coalesced", "latency_total", "latency_max"]
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.overflowed = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def latency_mean(self) -> float:
+        return self.latency_total / self.sent if self.sent else 0.0
+
+
+class LinkInbox:
+    """
+    The queue of ConnectionInMessages waiting to go to the game server.
+
+    Control messages (connects, disconnects and detail changes) have a lane of their own and
+    always go first. A client only ever has one detail change (UPDATE or DELTA) and one
+    THROTTLE waiting there: newer ones replace it, and DELTAs are merged. The control lane holds
+    at most control_cap messages.
+
+    Everything else waits in a lane per client, and the lanes are served round-robin so one
+    busy client can't hold up the rest. A client's lane holds at most client_cap messages and
+    all of them together at most max_size. Messages past any of these limits are refused and
+    counted as overflow. A DISCONNECT is never refused, and goes at the end of the client's
+    lane if it has one, so everything the client sent is delivered before it.
+    """
+
+    control_types = frozenset({
+        ConnectionInMessageType.CONNECT,
+        ConnectionInMessageType.READY,
+        ConnectionInMessageType.DISCONNECT,
+        ConnectionInMessageType.UPDATE,
+        ConnectionInMessageType.DELTA,
+        ConnectionInMessageType.THROTTLE,
+        ConnectionInMessageType.MIGRATE,
+    })
+
+    # control messages a newer one of the same kind replaces. A DELTA and an UPDATE are the same kind.
+    coalesced_types = {
+        ConnectionInMessageType.UPDATE: ConnectionInMessageType.UPDATE,
+        ConnectionInMessageType.DELTA: ConnectionInMessageType.UPDATE,
+        ConnectionInMessageType.THROTTLE: ConnectionInMessageType.THROTTLE,
+    }
+
+    def __init__(self, max_size: int = 10000, client_cap: int = 100, control_cap: int = 10000):
+        self.max_size = max_size
+        self.client_cap = client_cap
+        self.control_cap = control_cap
+        # [queued, msg] entries; lists, so a waiting message can be replaced in place.
+        self.control = deque()
+        # (client_id, kind) -> the control entry that newer messages of that kind replace.
+        self.pending: Dict[tuple, list] = dict()
+        self.lanes: Dict[str, deque] = dict()
+        # client IDs with something waiting, in the order they'll be served.
+        self.turns = OrderedDict()
+        self.size = 0
+        self.not_empty = asyncio.Event()
+        self.stats = InboxStats()
+
+    def __len__(self):
+        return len(self.control) + self.size
+
+    def empty(self) -> bool:
+        return not (self.control or self.size)
+
+    def put_nowait(self, msg: ConnectionInMessage) -> bool:
+        """
+        Queues msg. Returns False if it was refused because its lane or the inbox was full.
+        """
+        msg_type = msg.msg_type
+        client_id = msg.client_id
+        if msg_type == ConnectionInMessageType.DISCONNECT and (lane := self.lanes.get(client_id, None)):
+            lane.append((time.monotonic(), msg))
+            self.size += 1
+        elif msg_type in self.control_types:
+            if (kind := self.coalesced_types.get(msg_type, None)) is not None:
+                if (entry := self.pending.get((client_id, kind), None)):
+                    self.coalesce(entry, msg)
+                    self.stats.coalesced += 1
+                    return True
+            if len(self.control) >= self.control_cap and msg_type != ConnectionInMessageType.DISCONNECT:
+                self.stats.overflowed += 1
+                return False
+            entry = [time.monotonic(), msg]
+            self.control.append(entry)
+            if kind is not None:
+                self.pending[(client_id, kind)] = entry
+        else:
+            lane = self.lanes.get(client_id, None)
+            if self.size >= self.max_size or (lane and len(lane) >= self.client_cap):
+                self.stats.overflowed += 1
+                return False
+            if lane is None:
+                lane = self.lanes[client_id] = deque()
+            lane.append((time.monotonic(), msg))
+            self.turns[client_id] = None
+            self.size += 1
+        self.stats.queued += 1
+        self.not_empty.set()
+        return True
+
+    @staticmethod
+    def coalesce(entry: list, msg: ConnectionInMessage):
+        """
+        Folds msg into the waiting control entry it replaces.
+        """
+        waiting = entry[1]
+        if msg.msg_type == ConnectionInMessageType.DELTA:
+            if waiting.msg_type == ConnectionInMessageType.UPDATE:
+                # an UPDATE's details are read when it's sent, so they'll include the change.
+                return
+            msg = ConnectionInMessage(msg.msg_type, msg.client_id, {**waiting.data, **msg.data})
+        entry[1] = msg
+
+    def take_client(self, client_id: str) -> List[ConnectionInMessage]:
+        """
+        Removes and returns everything a client has waiting, its control messages first.
+        """
+        taken = list()
+        if any(msg.client_id == client_id for queued, msg in self.control):
+            kept = deque()
+            for entry in self.control:
+                if entry[1].client_id == client_id:
+                    taken.append(entry[1])
+                else:
+                    kept.append(entry)
+            self.control = kept
+            for kind in set(self.coalesced_types.values()):
+                self.pending.pop((client_id, kind), None)
+        if (lane := self.lanes.pop(client_id, None)):
+            self.size -= len(lane)
+            self.turns.pop(client_id, None)
+            taken.extend(msg for queued, msg in lane)
+        return taken
+
+    def get_nowait(self) -> ConnectionInMessage:
+        if self.control:
+            queued, msg = entry = self.control.popleft()
+            if (kind := self.coalesced_types.get(msg.msg_type, None)) is not None:
+                key = (msg.client_id, kind)
+                if self.pending.get(key, None) is entry:
+                    del self.pending[key]
+        elif self.turns:
+            client_id = next(iter(self.turns))
+            lane = self.lanes[client_id]
+            queued, msg = lane.popleft()
+            self.size -= 1
+            if lane:
+                self.turns.move_to_end(client_id)
+            else:
+                del self.turns[client_id]
+                del self.lanes[client_id]
+        else:
+            raise asyncio.QueueEmpty()
+        stats = self.stats
+        stats.sent += 1
+        waited = time.monotonic() - queued
+        stats.latency_total += waited
+        if waited > stats.latency_max:
+            stats.latency_max = waited
+        return msg
+
+    async def get(self) -> ConnectionInMessage:
+        while self.empty():
+            self.not_empty.clear()
+            await self.not_empty.wait()
+        return self.get_nowait()
+
+
+class LinkState(IntEnum):
+    # no game server has connected since the gateway started.
+    WAITING = 0
+    CONNECTED = 1
+    DISCONNECTED = 2
+    # a game server connected again after a disconnect.
+    RESUMED = 3
+
+
+class LinkChannel:
+    """
+    One named link to a game server, and everything about it that outlives any one websocket
+    connection: its inbox, its unacknowledged frames and its state. link is the Link serving
+    it right now, if there is one.
+    """
+
+    def __init__(self, manager, name: str, inbox_size: int = 10000, inbox_client_cap: int = 100,
+                 inbox_control_cap: int = 10000, replay_frames: int = 1000):
+        self.manager = manager
+        self.name = name
+        self.inbox = LinkInbox(max_size=inbox_size, client_cap=inbox_client_cap, control_cap=inbox_control_cap)
+        # the seq of the last EVENTS frame, and (seq, messages) for every frame the game server
+        # hasn't acknowledged yet, up to replay_frames of them.
+        self.seq = 0
+        self.unacked = deque(maxlen=replay_frames)
+        self.link: Optional[Link] = None
+        self.state = LinkState.WAITING
+        # named sets of client IDs that BROADCAST messages can target. Managed by GROUP messages.
+        self.groups: Dict[str, Set[str]] = dict()
+
+    @property
+    def up(self) -> bool:
+        return self.state in (LinkState.CONNECTED, LinkState.RESUMED)
+
+    def set_state(self, state: LinkState):
+        if state == self.state:
+            return
+        old = self.state
+        self.state = state
+        self.manager.app.on_link_state(self, old, state)
+
+    async def close_link(self):
+        link = self.link
+        self.link = None
+        if link.task:
+            link.task.cancel()
+        else:
+            await link.ws.close()
+
+    def record(self, msgs: List[ConnectionInMessage]) -> int:
+        """
+        Keeps msgs until the game server acknowledges them, and returns their seq.
+        """
+        self.seq += 1
+        self.unacked.append((self.seq, msgs))
+        return self.seq
+
+    def acknowledge(self, seq, epoch) -> bool:
+        """
+        Forgets every frame up to seq. Returns False, and does nothing, if the ack isn't for
+        frames from this boot of the gateway.
+        """
+        if epoch != self.manager.epoch or not isinstance(seq, int) or seq > self.seq:
+            return False
+        unacked = self.unacked
+        while unacked and unacked[0][0] <= seq:
+            unacked.popleft()
+        return True
+
+    def missing_after(self, seq: int) -> Optional[range]:
+        """
+        Returns the seqs after seq that are no longer kept for replay, or None if there are none.
+        """
+        first = self.unacked[0][0] if self.unacked else self.seq + 1
+        return range(seq + 1, first) if first > seq + 1 else None
 
-from .shared import LinkMessage, LinkMessageType, ConnectionOutMessage
 
 class Link:
 
-    def __init__(self, manager, ws, path):
+    def __init__(self, manager, channel: LinkChannel, ws, path):
         self.manager = manager
+        self.channel = channel
         self.ws = ws
         self.path = path
         self.task = None
+        self.codec: LinkCodec = JSON_CODEC
+        # set once the game server answers our HELLO. ack is the last seq it says it processed.
+        self.hello = asyncio.Event()
+        self.ack: Optional[int] = None
 
     async def run(self):
-        await self.on_connect()
+        # the task exists before HELLO goes out, so a link replaced while it's still sending
+        # HELLO can be cancelled.
         self.task = asyncio.create_task(self.run_do())
         await self.task
 
     async def run_do(self):
-        await asyncio.gather(self.read(), self.write())
+        await self.on_connect()
+        writer = asyncio.create_task(self.write())
+        try:
+            await self.read()
+        finally:
+            writer.cancel()
+
+    def owns(self, client_id: str) -> bool:
+        return self.manager.route(client_id) is self.channel
+
+    def owned_clients(self) -> List[str]:
+        route = self.manager.route
+        return [k for k in self.manager.app.game_clients.keys() if route(k) is self.channel]
+
+    def hello_chunks(self) -> Iterator[dict]:
+        """
+        Yields the clients this link owns as {client_id: details} dicts of at most hello_chunk
+        clients each, building each one only when it's needed. Clients that disconnect before
+        their chunk is built are left out.
+        """
+        game_clients = self.manager.app.game_clients
+        size = self.manager.hello_chunk
+        owned = self.owned_clients()
+        for i in range(0, len(owned), size):
+            chunk = dict()
+            for client_id in owned[i:i + size]:
+                if (client := game_clients.get(client_id, None)):
+                    chunk[client_id] = details_to_dict(client.details)
+            yield chunk
 
     async def on_connect(self):
-        clients = {k: v.details.to_dict() for k, v in self.manager.app.game_clients.items()}
-        msg = LinkMessage(LinkMessageType.HELLO, os.getpid(), clients)
-        await self.ws.send(ujson.dumps(msg.to_dict()))
+        app = self.manager.app
+        await self.send_hello({"codecs": list(CODECS.keys()), "worker": app.worker, "workers": app.workers,
+                               "link": self.channel.name, "seq": self.channel.seq, "epoch": self.manager.epoch})
+
+    async def send_hello(self, data: dict):
+        """
+        Sends HELLO with data, followed by the client snapshot. The snapshot is streamed over as
+        many HELLO frames as it takes, each flagged "more" until the last, yielding to the event
+        loop between them.
+        """
+        chunks = self.hello_chunks()
+        clients = next(chunks, dict())
+        while True:
+            following = next(chunks, None)
+            data["clients"] = clients
+            data["more"] = following is not None
+            await self.ws.send(JSON_CODEC.encode_link(LinkMessage(LinkMessageType.HELLO, os.getpid(), data)))
+            if following is None:
+                return
+            clients = following
+            data = dict()
+            await asyncio.sleep(0)
 
     async def read(self):
-        async for message in self.ws:
-            await self.process(message)
-
-    async def process(self, msg_text):
-        js = ujson.loads(msg_text)
-        if "client_id" in js:
-            msg = ConnectionOutMessage.from_dict(js)
-            if (client := self.manager.app.game_clients.get(msg.client_id, None)):
-                await client.process_out_event(msg)
-        elif "process_id" in js:
-            msg = LinkMessage.from_dict(js)
-            await self.process_link_message(msg)
+        try:
+            async for message in self.ws:
+                try:
+                    await self.process(message)
+                except MALFORMED as err:
+                    # one bad message mustn't take the link down for every client.
+                    logger.warning("link %s: dropped malformed message: %r", self.channel.name, err)
+        except ConnectionClosed:
+            pass
+
+    async def process(self, data: Union[str, bytes]):
+        # text frames are always JSON, so the HELLO that picks a codec can always be read.
+        codec = JSON_CODEC if isinstance(data, str) else self.codec
+        msg = codec.decode(data)
+        if isinstance(msg, ConnectionOutMessage):
+            await self.process_out_message(msg)
+        else:
+            await self.process_link_message(msg, codec)
+
+    async def process_out_message(self, msg: ConnectionOutMessage):
+        # a link may only talk to the clients routed to it.
+        if not self.owns(msg.client_id):
+            return
+        if (client := self.manager.app.game_clients.get(msg.client_id, None)):
+            await client.process_out_event(msg)
+
+    async def process_link_message(self, msg: LinkMessage, codec: LinkCodec):
+        if msg.msg_type == LinkMessageType.EVENTS:
+            for ev in msg.data:
+                await self.process_out_message(codec.decode_out_message(ev))
+        elif msg.msg_type == LinkMessageType.BROADCAST:
+            await self.process_broadcast(msg)
+        elif msg.msg_type == LinkMessageType.GROUP:
+            self.process_group(msg)
+        elif msg.msg_type == LinkMessageType.ACK:
+            if isinstance(msg.data, dict):
+                self.channel.acknowledge(msg.data.get("seq", None), msg.data.get("epoch", None))
+        elif msg.msg_type == LinkMessageType.MIGRATE:
+            clients, name = msg.data["clients"], msg.data["link"]
+            if not (isinstance(clients, list) and all(isinstance(c, str) for c in clients) and isinstance(name, str)):
+                raise TypeError(f"MIGRATE needs a list of client IDs and a link name, got {msg.data!r}")
+            if not self.manager.migrate(clients, name, source=self.channel):
+                logger.warning("link %s: MIGRATE to unknown link %r ignored", self.channel.name, name)
+        elif msg.msg_type == LinkMessageType.HELLO:
+            if msg.data:
+                if (name := msg.data.get("codec", None)) in CODECS:
+                    self.codec = CODECS[name]
+                if self.channel.acknowledge(msg.data.get("ack", None), msg.data.get("epoch", None)):
+                    self.ack = msg.data["ack"]
+            self.hello.set()
+
+    async def process_broadcast(self, msg: LinkMessage):
+        """
+        Fans a single payload out to many clients. Clients sharing a render profile will
+        re-use each other's rendered output. Only clients routed to this link receive it.
+        """
+        data = msg.data
+        game_clients = self.manager.app.game_clients
+        group = data.get("group", None)
+        if group is not None:
+            targets = self.channel.groups.get(group, set())
+        elif (targets := data.get("clients", None)) is None:
+            targets = self.owned_clients()
+        msg_type = ConnectionOutMessageType(data["msg_type"])
+        payload = data.get("data", None)
+        gone = list()
+        for client_id in list(targets):
+            if not (client := game_clients.get(client_id, None)):
+                if group is not None:
+                    gone.append(client_id)
+            elif self.owns(client_id):
+                await client.process_out_event(ConnectionOutMessage(msg_type, client_id, payload))
+        if gone:
+            targets.difference_update(gone)
+
+    def process_group(self, msg: LinkMessage):
+        data = msg.data
+        groups = self.channel.groups
+        name = data["name"]
+        if not isinstance(name, str):
+            raise TypeError(f"GROUP name must be a string, got {name!r}")
+        if data.get("clear", False):
+            groups.pop(name, None)
+        members = groups.setdefault(name, set())
+        members.update(data.get("add", ()))
+        members.difference_update(data.get("remove", ()))
+        if not members:
+            del groups[name]
+
+    async def resume(self):
+        """
+        Waits (up to the manager's hello_timeout) for the game server to answer our HELLO, then
+        re-sends every unacknowledged EVENTS frame after the seq it acknowledged. If it gives no
+        ack, or one from another boot of the gateway, nothing is re-sent.
+
+        If some of those frames were already pushed out of the replay buffer, nothing is re-sent
+        either. The game server is sent a resync HELLO instead: it names the missing seqs and
+        carries a fresh client snapshot, which replaces everything up to the current seq.
+        """
+        manager = self.manager
+        channel = self.channel
+        if manager.hello_timeout > 0:
+            try:
+                await asyncio.wait_for(self.hello.wait(), manager.hello_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.ack is None:
+            return
+        if (missing := channel.missing_after(self.ack)) is not None:
+            channel.unacked.clear()
+            await self.send_hello({"resync": True, "missing": [missing[0], missing[-1]], "link": channel.name,
+                                   "seq": channel.seq, "epoch": manager.epoch})
+            return
+        codec = self.codec
+        for seq, msgs in list(channel.unacked):
+            if seq > self.ack:
+                await self.ws.send(codec.encode_events(os.getpid(), [codec.encode_event(m) for m in msgs], seq))
 
     async def write(self):
-        while True:
-            msg = await self.manager.inbox.get()
-            await self.ws.send(ujson.dumps(msg.to_dict()))
+        """
+        Sends everything waiting in the inbox as batched EVENTS frames. After the first message,
+        a batch keeps collecting until it reaches batch_count messages or batch_size bytes, or
+        until batch_window microseconds have passed with nothing else arriving.
+
+        Each frame is numbered and kept by the channel until the game server acknowledges it,
+        so a batch cut short by the link dropping is replayed on the next link.
+        """
+        manager = self.manager
+        channel = self.channel
+        inbox = channel.inbox
+        window = manager.batch_window / 1000000
+        msgs: List[ConnectionInMessage] = list()
+        try:
+            await self.resume()
+            while True:
+                msg = await inbox.get()
+                codec = self.codec
+                batch = list()
+                size = 0
+                while True:
+                    msgs.append(msg)
+                    encoded = codec.encode_event(msg)
+                    batch.append(encoded)
+                    size += len(encoded)
+                    if len(batch) >= manager.batch_count or size >= manager.batch_size:
+                        break
+                    if not inbox.empty():
+                        msg = inbox.get_nowait()
+                        continue
+                    # the window starts over with every message, so a batch closes once the
+                    # inbox has been idle that long.
+                    try:
+                        msg = await asyncio.wait_for(inbox.get(), window)
+                    except asyncio.TimeoutError:
+                        break
+                seq = channel.record(msgs)
+                msgs = list()
+                await self.ws.send(codec.encode_events(os.getpid(), batch, seq))
+        except ConnectionClosed:
+            pass
+        finally:
+            if msgs:
+                channel.record(msgs)
+
 
 class LinkManager:
+    """
+    Accepts websocket connections from game servers. Each one is a named link, named by the
+    path it connects to (ws://host:port/name); the root path is the default link. Only the
+    default link and those named in link_names are accepted. Several links can be up at once,
+    and a new connection only replaces one with the same name.
 
-    def __init__(self, app, interface: str, port: int):
+    Clients are routed to the default link unless a MIGRATE message has moved them elsewhere.
+    """
+
+    # waiting messages a migrating client's READY replaces.
+    superseded_by_ready = frozenset({
+        ConnectionInMessageType.READY,
+        ConnectionInMessageType.UPDATE,
+        ConnectionInMessageType.DELTA,
+    })
+
+    def __init__(self, app, interface: str, port: int, batch_count: int = 100, batch_size: int = 65536,
+                 batch_window: int = 500, replay_frames: int = 1000, hello_timeout: float = 5.0,
+                 inbox_size: int = 10000, inbox_client_cap: int = 100, inbox_control_cap: int = 10000,
+                 default_link: str = "default", hello_chunk: int = 500, link_names: Optional[List[str]] = None):
         self.app = app
         self.interface = interface
         self.port = port
-        self.inbox = asyncio.Queue()
-        self.link = None
+        self.batch_count = batch_count
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.replay_frames = replay_frames
+        self.hello_timeout = hello_timeout
+        self.inbox_size = inbox_size
+        self.inbox_client_cap = inbox_client_cap
+        self.inbox_control_cap = inbox_control_cap
+        # how many clients' details go in each HELLO frame.
+        self.hello_chunk = max(hello_chunk, 1)
+        # identifies this boot of the gateway, so acks meant for another one are ignored.
+        self.epoch = app.ids.nonce
+        self.channels: Dict[str, LinkChannel] = dict()
+        self.default_link = default_link
+        self.default = self.channel(default_link)
+        # every channel is made up front, so connections can't add more.
+        for name in link_names or ():
+            self.channel(name)
+        # client ID -> link name, for clients that aren't on the default link.
+        self.routes: Dict[str, str] = dict()
         self.quitting = False
         self.ready = False
         self.server = None
@@ -62,12 +565,79 @@ class LinkManager:
         while not self.quitting:
             await asyncio.sleep(1)
 
-    async def handle_ws(self, ws, path):
-        if self.link:
-            await self.close_link()
-        self.link = Link(self, ws, path)
-        await self.link.run()
+    def channel(self, name: str) -> LinkChannel:
+        if (found := self.channels.get(name, None)) is None:
+            found = self.channels[name] = LinkChannel(self, name, inbox_size=self.inbox_size,
+                                                      inbox_client_cap=self.inbox_client_cap,
+                                                      inbox_control_cap=self.inbox_control_cap,
+                                                      replay_frames=self.replay_frames)
+        return found
 
-    async def close_link(self):
-        self.link.task.cancel()
-        self.link = None
+    def route(self, client_id: str) -> LinkChannel:
+        if (name := self.routes.get(client_id, None)) is None:
+            return self.default
+        return self.channels[name]
+
+    def put(self, msg: ConnectionInMessage):
+        """
+        Queues a message from a client for the link it's routed to. If the inbox refuses the
+        client's input, the app is told so it can let the client know. A refused control message
+        isn't anything the client sent, so it's only logged.
+        """
+        channel = self.route(msg.client_id)
+        if not channel.inbox.put_nowait(msg):
+            if msg.msg_type in LinkInbox.control_types:
+                logger.warning("link %s: control lane full, dropped %s for %s",
+                               channel.name, msg.msg_type.name, msg.client_id)
+            elif (client := self.app.game_clients.get(msg.client_id, None)):
+                self.app.on_input_dropped(client)
+        if msg.msg_type == ConnectionInMessageType.DISCONNECT:
+            self.routes.pop(msg.client_id, None)
+
+    def migrate(self, client_ids: List[str], name: str, source: Optional[LinkChannel] = None) -> bool:
+        """
+        Moves clients to another link, along with everything they have waiting. The link they
+        leave is sent a MIGRATE event, and the one they join a READY with their details, which
+        takes the place of any detail changes they had waiting. If source is given, only
+        clients routed to it are moved.
+
+        Returns False, and moves nothing, if no link by that name is configured.
+        """
+        if (target := self.channels.get(name, None)) is None:
+            return False
+        game_clients = self.app.game_clients
+        for client_id in client_ids:
+            if not (client := game_clients.get(client_id, None)):
+                continue
+            current = self.route(client_id)
+            if current is target or (source is not None and current is not source):
+                continue
+            if target is self.default:
+                self.routes.pop(client_id, None)
+            else:
+                self.routes[client_id] = name
+            waiting = current.inbox.take_client(client_id)
+            current.inbox.put_nowait(ConnectionInMessage(ConnectionInMessageType.MIGRATE, client_id, {"link": name}))
+            if client.started:
+                target.inbox.put_nowait(ConnectionInMessage(ConnectionInMessageType.READY, client_id, client.details))
+                waiting = [msg for msg in waiting if msg.msg_type not in self.superseded_by_ready]
+            for msg in waiting:
+                target.inbox.put_nowait(msg)
+        return True
+
+    async def handle_ws(self, ws, path):
+        if (channel := self.channels.get(path.strip("/") or self.default_link, None)) is None:
+            logger.warning("refused a link connection for unknown link path %r", path)
+            await ws.close(code=4004, reason="unknown link")
+            return
+        if channel.link:
+            await channel.close_link()
+        link = channel.link = Link(self, channel, ws, path)
+        if not channel.up:
+            channel.set_state(LinkState.CONNECTED if channel.state == LinkState.WAITING else LinkState.RESUMED)
+        try:
+            await link.run()
+        finally:
+            if channel.link is link:
+                channel.link = None
+                channel.set_state(LinkState.DISCONNECTED)
@@ -2,22 +2,36 @@
 This module installs monkey patches to Rich, allowing it to support MXP.
 """
 import html
+import marshal
 from dataclasses import dataclass
 import random
 import re
+from collections import defaultdict
 
-from typing import Any, Dict, Iterable, List, Optional, Type, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 from rich.color import Color, ColorSystem
 
 from rich.style import Style as OLD_STYLE
 from rich.text import Text as OLD_TEXT, Segment, Span
 from rich.console import Console as OLD_CONSOLE, ConsoleOptions as OLD_CONSOLE_OPTIONS, NoChange, NO_CHANGE
-from rich.console import JustifyMethod, OverflowMethod
+from rich.console import JustifyMethod, OverflowMethod, COLOR_SYSTEMS
 
 _RE_SQUISH = re.compile("\S+")
 _RE_NOTSPACE = re.compile("[^ ]+")
 
+# (prefix, suffix) pairs for MudStyle.escapes, keyed by style and render flags.
+_ESCAPE_CACHE: Dict[tuple, Tuple[str, str]] = dict()
+
+# Style attribute names, in the order of their bits in Style._attributes.
+_STYLE_ATTRIBUTES = ("bold", "dim", "italic", "underline", "blink", "blink2", "reverse", "conceal", "strike",
+                     "underline2", "frame", "encircle", "overline")
+
+# MudStyles created by intern_style, keyed by their serialized form.
+_STYLE_INTERN: Dict[tuple, "MudStyle"] = dict()
+_STYLE_INTERN_SIZE = 4096
+
+
 class MudStyle(OLD_STYLE):
 
     __slots__ = [
@@ -26,6 +40,9 @@ class MudStyle(OLD_STYLE):
         "_xml_attr_data"
     ]
 
+    # how many entries _ESCAPE_CACHE may hold before it's cleared.
+    escape_cache_size = 4096
+
     def __init__(
             self,
             *,
@@ -84,6 +101,28 @@ class MudStyle(OLD_STYLE):
     def upgrade(cls, old):
         return cls.parse(str(old))
 
+    def serialize(self) -> dict:
+        """
+        Returns the keyword arguments needed to re-create this style with MudStyle(**data).
+        """
+        out = dict()
+        if self._color:
+            out["color"] = self._color.name
+        if self._bgcolor:
+            out["bgcolor"] = self._bgcolor.name
+        for bit, name in enumerate(_STYLE_ATTRIBUTES):
+            if self._set_attributes & (1 << bit):
+                out[name] = bool(self._attributes & (1 << bit))
+        if self._link:
+            out["link"] = self._link
+        if self._meta:
+            out["meta"] = self.meta
+        if self._tag:
+            out["tag"] = self._tag
+        if self._xml_attr:
+            out["xml_attr"] = self._xml_attr
+        return out
+
     def render(
         self,
         text: str = "",
@@ -103,32 +142,66 @@ class MudStyle(OLD_STYLE):
         Returns:
             str: A string containing ANSI style codes.
         """
-        out_text = text
-        if not out_text:
-            return out_text
+        if not text:
+            return text
+        prefix, suffix = self.escapes(
+            color_system=color_system, legacy_windows=legacy_windows, mxp=mxp, pueblo=pueblo, links=links
+        )
+        return f"{prefix}{text}{suffix}"
+
+    def escapes(
+        self,
+        *,
+        color_system: Optional[ColorSystem] = ColorSystem.TRUECOLOR,
+        legacy_windows: bool = False,
+        mxp: bool = False,
+        pueblo: bool = False,
+        links: bool = True,
+    ) -> Tuple[str, str]:
+        """
+        Returns the (prefix, suffix) pair that render() wraps text in. These are cached per
+        style and render flags, so rendering a segment is just string concatenation. Styles
+        with a link aren't cached: each gets its own link id, so they'd never be found again.
+        """
+        if isinstance(color_system, str):
+            color_system = COLOR_SYSTEMS[color_system]
+        cached = self.escape_cache_size > 0 and not self._link
+        if cached:
+            key = (self._hash, color_system, legacy_windows, mxp, pueblo, links)
+            found = _ESCAPE_CACHE.get(key, None)
+            if found is not None:
+                return found
+
+        prefix = suffix = ""
         if color_system is not None:
+            # Style caches its codes without regard to color system, so make sure they're fresh.
+            self._ansi = None
             attrs = self._make_ansi_codes(color_system)
-            rendered = f"\x1b[{attrs}m{out_text}\x1b[0m" if attrs else out_text
-        else:
-            rendered = out_text
+            if attrs:
+                prefix, suffix = f"\x1b[{attrs}m", "\x1b[0m"
         if links and self._link and not legacy_windows:
-            rendered = (
-                f"\x1b]8;id={self._link_id};{self._link}\x1b\\{rendered}\x1b]8;;\x1b\\"
-            )
+            prefix = f"\x1b]8;id={self._link_id};{self._link}\x1b\\{prefix}"
+            suffix = f"{suffix}\x1b]8;;\x1b\\"
         if (pueblo or mxp) and self._tag:
             if mxp:
                 if self._xml_attr:
-                    rendered = f"\x1b[4z<{self._tag} {self._xml_attr_data}>{rendered}\x1b[4z</{self._tag}>"
+                    prefix = f"\x1b[4z<{self._tag} {self._xml_attr_data}>{prefix}"
                 else:
-                    rendered = f"\x1b[4z<{self._tag}>{rendered}\x1b[4z</{self._tag}>"
+                    prefix = f"\x1b[4z<{self._tag}>{prefix}"
+                suffix = f"{suffix}\x1b[4z</{self._tag}>"
             else:
                 if self._xml_attr:
-                    rendered = (
-                        f"{self._tag} {self._xml_attr_data}>{rendered}</{self._tag}>"
-                    )
+                    prefix = f"{self._tag} {self._xml_attr_data}>{prefix}"
                 else:
-                    rendered = f"<{self._tag}>{rendered}</{self._tag}>"
-        return rendered
+                    prefix = f"<{self._tag}>{prefix}"
+                suffix = f"{suffix}</{self._tag}>"
+
+        found = (prefix, suffix)
+        if cached:
+            if len(_ESCAPE_CACHE) >= self.escape_cache_size:
+                _ESCAPE_CACHE.clear()
+            _ESCAPE_CACHE[key] = found
+        return found
 
     def __add__(self, style: Union["Style", str]) -> "Style":
         if isinstance(style, str):
@@ -150,10 +223,22 @@ class MudStyle(OLD_STYLE):
         new_style._set_attributes = self._set_attributes | style._set_attributes
         new_style._link = style._link or self._link
         new_style._link_id = style._link_id or self._link_id
+        new_style._meta = style._meta or self._meta
         new_style._tag = style._tag or self._tag
         new_style._xml_attr = style._xml_attr or self._xml_attr
         new_style._xml_attr_data = style._xml_attr_data or self._xml_attr_data
-        new_style._hash = style._hash
+        new_style._hash = hash(
+            (
+                new_style._color,
+                new_style._bgcolor,
+                new_style._attributes,
+                new_style._set_attributes,
+                new_style._link,
+                new_style._meta,
+                new_style._tag,
+                new_style._xml_attr_data
+            )
+        )
         new_style._null = self._null or style._null
 
         return new_style
@@ -165,6 +250,22 @@ class MudStyle(OLD_STYLE):
         return NotImplemented
 
 
+def intern_style(data: dict) -> MudStyle:
+    """
+    Returns a shared MudStyle for a serialized style dict, creating it if it isn't cached.
+    """
+    # meta can hold anything marshal can, so it's keyed by its marshaled form rather than its items.
+    key = tuple(
+        (k, marshal.dumps(v) if k == "meta" else tuple(sorted(v.items())) if isinstance(v, dict) else v)
+        for k, v in sorted(data.items())
+    )
+    if (style := _STYLE_INTERN.get(key, None)) is None:
+        if len(_STYLE_INTERN) >= _STYLE_INTERN_SIZE:
+            _STYLE_INTERN.clear()
+        style = _STYLE_INTERN[key] = MudStyle(**data)
+    return style
+
+
 @dataclass
 class MudConsoleOptions(OLD_CONSOLE_OPTIONS):
     mxp: Optional[bool] = False
@@ -338,255 +439,316 @@ class MudText(OLD_TEXT):
         """
         return self.plain.__format__(format_spec)
 
-        # Begin implementing Python String Api below...
+    # Begin implementing Python String Api below...
 
-        def capitalize(self):
-            return self.__class__(text=self.plain.capitalize(), style=self.style, spans=list(self.spans))
+    def capitalize(self):
+        return self.__class__(text=self.plain.capitalize(), style=self.style, spans=list(self.spans))
 
-        def count(self, *args, **kwargs):
-            return self.plain.count(*args, **kwargs)
+    def count(self, *args, **kwargs):
+        return self.plain.count(*args, **kwargs)
 
-        def startswith(self, *args, **kwargs):
-            return self.plain.startswith(*args, **kwargs)
+    def startswith(self, *args, **kwargs):
+        return self.plain.startswith(*args, **kwargs)
 
-        def endswith(self, *args, **kwargs):
-            return self.plain.endswith(*args, **kwargs)
+    def endswith(self, *args, **kwargs):
+        return self.plain.endswith(*args, **kwargs)
 
-        def find(self, *args, **kwargs):
-            return self.plain.find(*args, **kwargs)
+    def find(self, *args, **kwargs):
+        return self.plain.find(*args, **kwargs)
 
-        def index(self, *args, **kwargs):
-            return self.plain.index(*args, **kwargs)
+    def index(self, *args, **kwargs):
+        return self.plain.index(*args, **kwargs)
 
-        def isalnum(self):
-            return self.plain.isalnum()
+    def isalnum(self):
+        return self.plain.isalnum()
 
-        def isalpha(self):
-            return self.plain.isalpha()
+    def isalpha(self):
+        return self.plain.isalpha()
 
-        def isdecimal(self):
-            return self.plain.isdecimal()
+    def isdecimal(self):
+        return self.plain.isdecimal()
 
-        def isdigit(self):
-            return self.plain.isdigit()
+    def isdigit(self):
+        return self.plain.isdigit()
 
-        def isidentifier(self):
-            return self.plain.isidentifier()
+    def isidentifier(self):
+        return self.plain.isidentifier()
 
-        def islower(self):
-            return self.plain.islower()
+    def islower(self):
+        return self.plain.islower()
 
-        def isnumeric(self):
-            return self.plain.isnumeric()
+    def isnumeric(self):
+        return self.plain.isnumeric()
 
-        def isprintable(self):
-            return self.plain.isprintable()
+    def isprintable(self):
+        return self.plain.isprintable()
 
-        def isspace(self):
-            return self.plain.isspace()
+    def isspace(self):
+        return self.plain.isspace()
 
-        def istitle(self):
-            return self.plain.istitle()
+    def istitle(self):
+        return self.plain.istitle()
 
-        def isupper(self):
-            return self.plain.isupper()
+    def isupper(self):
+        return self.plain.isupper()
 
-        def center(self, width, fillchar=" "):
-            changed = self.plain.center(width, fillchar)
-            start = changed.find(self.plain)
-            lside = changed[:start]
-            rside = changed[len(lside) + len(self.plain):]
-            idx = self.disassemble_bits()
-            new_idx = list()
-            for c in lside:
-                new_idx.append((None, c))
-            new_idx.extend(idx)
-            for c in rside:
-                new_idx.append((None, c))
-            return self.__class__.assemble_bits(new_idx)
+    def center(self, width, fillchar=" "):
+        changed = self.plain.center(width, fillchar)
+        # str.center's own split of the padding, since find() can't tell fill from text.
+        margin = len(changed) - len(self.plain)
+        start = margin // 2 + (margin & width & 1)
+        lside = changed[:start]
+        rside = changed[len(lside) + len(self.plain):]
+        idx = self.disassemble_bits()
+        new_idx = list()
+        for c in lside:
+            new_idx.append((None, c))
+        new_idx.extend(idx)
+        for c in rside:
+            new_idx.append((None, c))
+        return self.__class__.assemble_bits(new_idx)
 
-        def ljust(self, width: int, fillchar: Union[str, "MudText"] = " "):
-            diff = width - len(self)
-            out = self.copy()
-            if diff <= 0:
-                return out
-            else:
-                if isinstance(fillchar, str):
-                    fillchar = self.__class__(fillchar)
-                out.append(fillchar * diff)
-                return out
-
-        def rjust(self, width: int, fillchar: Union[str, "MudText"] = " "):
-            diff = width - len(self)
-            if diff <= 0:
-                return self.copy()
-            else:
-                if isinstance(fillchar, str):
-                    fillchar = self.__class__(fillchar)
-                out = fillchar * diff
-                out.append(self)
-                return out
-
-        def lstrip(self, chars: str = None):
-            lstripped = self.plain.lstrip(chars)
-            strip_count = len(self.plain) - len(lstripped)
-            return self[strip_count:]
-
-        def strip(self, chars: str = " "):
-            out_map = self.disassemble_bits()
-            for i, e in enumerate(out_map):
-                if e[1] != chars:
-                    out_map = out_map[i:]
-                    break
-            out_map.reverse()
-            for i, e in enumerate(out_map):
-                if e[1] != chars:
-                    out_map = out_map[i:]
-                    break
-            out_map.reverse()
-            return self.__class__.assemble_bits(out_map)
-
-        def replace(self, old: str, new: Union[str, "Text"], count=None) -> "Text":
-            if not (indexes := self.find_all(old)):
-                return self.clone()
-            if count and count > 0:
-                indexes = indexes[:count]
-            old_len = len(old)
-            new_len = len(new)
-            other = self.clone()
-            markup_idx_map = self.disassemble_bits()
-            other_map = other.disassemble_bits()
-
-            for idx in reversed(indexes):
-                final_markup = markup_idx_map[idx + old_len][0]
-                diff = abs(old_len - new_len)
-                replace_chars = min(new_len, old_len)
-                # First, replace any characters that overlap.
-                for i in range(replace_chars):
-                    other_map[idx + i] = (markup_idx_map[idx + i][0], new[i])
-                if old_len == new_len:
-                    pass  # the nicest case. nothing else needs doing.
-                elif old_len > new_len:
-                    # slightly complex. pop off remaining characters.
-                    for i in range(diff):
-                        deleted = other_map.pop(idx + new_len)
-                elif new_len > old_len:
-                    # slightly complex. insert new characters.
-                    for i in range(diff):
-                        other_map.insert(
-                            idx + old_len + i, (final_markup, new[old_len + i])
-                        )
-
-            return self.__class__.assemble_bits(other_map)
-
-        def find_all(self, sub: str):
-            indexes = list()
-            start = 0
-            while True:
-                start = self.plain.find(sub, start)
-                if start == -1:
-                    return indexes
-                indexes.append(start)
-                start += len(sub)
-
-        def scramble(self):
-            idx = self.disassemble_bits()
-            random.shuffle(idx)
-            return self.__class__.assemble_bits(idx)
-
-        def reverse(self):
-            idx = self.disassemble_bits()
-            idx.reverse()
-            return self.__class__.assemble_bits(idx)
-
-        @classmethod
-        def assemble_bits(cls, idx: List[Tuple[Optional[Union[str, Style, None]], str]]):
-            out = cls()
-            for i, t in enumerate(idx):
-                s = [Span(0, 1, t[0])]
-                out.append_text(cls(text=t[1], spans=s))
+    def ljust(self, width: int, fillchar: Union[str, "MudText"] = " "):
+        diff = width - len(self)
+        out = self.copy()
+        if diff <= 0:
+            return out
+        else:
+            if isinstance(fillchar, str):
+                fillchar = self.__class__(fillchar)
+            out.append(fillchar * diff)
             return out
 
-        def style_at_index(self, offset: int) -> Style:
-            if offset < 0:
-                offset = len(self) + offset
+    def rjust(self, width: int, fillchar: Union[str, "MudText"] = " "):
+        diff = width - len(self)
+        if diff <= 0:
+            return self.copy()
+        else:
+            if isinstance(fillchar, str):
+                fillchar = self.__class__(fillchar)
+            out = fillchar * diff
+            out.append(self)
+            return out
+
+    def lstrip(self, chars: str = None):
+        lstripped = self.plain.lstrip(chars)
+        strip_count = len(self.plain) - len(lstripped)
+        return self[strip_count:]
+
+    def strip(self, chars: str = None):
+        start = len(self.plain) - len(self.plain.lstrip(chars))
+        end = len(self.plain.rstrip(chars))
+        out_map = self.disassemble_bits()[start:end] if end > start else list()
+        return self.__class__.assemble_bits(out_map)
+
+    def replace(self, old: str, new: str, count: int = -1) -> "MudText":
+        """
+        Like str.replace. Replacement characters take the style of the characters they replace;
+        any past the end of old take the style of old's last character.
+        """
+        if not (indexes := self.find_all(old)):
+            return self.copy()
+        if count is not None and count >= 0:
+            indexes = indexes[:count]
+        old_len = len(old)
+        new_len = len(new)
+        other = self.copy()
+        markup_idx_map = self.disassemble_bits()
+        other_map = other.disassemble_bits()
+
+        for idx in reversed(indexes):
+            final_markup = markup_idx_map[idx + old_len - 1][0]
+            diff = abs(old_len - new_len)
+            replace_chars = min(new_len, old_len)
+            # First, replace any characters that overlap.
+            for i in range(replace_chars):
+                other_map[idx + i] = (markup_idx_map[idx + i][0], new[i])
+            if old_len == new_len:
+                pass  # the nicest case. nothing else needs doing.
+            elif old_len > new_len:
+                # slightly complex. pop off remaining characters.
+                for i in range(diff):
+                    deleted = other_map.pop(idx + new_len)
+            elif new_len > old_len:
+                # slightly complex. insert new characters.
+                for i in range(diff):
+                    other_map.insert(
+                        idx + old_len + i, (final_markup, new[old_len + i])
+                    )
+
+        return self.__class__.assemble_bits(other_map)
+
+    def find_all(self, sub: str):
+        indexes = list()
+        if not sub:
+            return indexes
+        start = 0
+        while True:
+            start = self.plain.find(sub, start)
+            if start == -1:
+                return indexes
+            indexes.append(start)
+            start += len(sub)
+
+    def scramble(self):
+        idx = self.disassemble_bits()
+        random.shuffle(idx)
+        return self.__class__.assemble_bits(idx)
+
+    def reverse(self):
+        idx = self.disassemble_bits()
+        idx.reverse()
+        return self.__class__.assemble_bits(idx)
+
+    @classmethod
+    def assemble_bits(cls, idx: List[Tuple[Optional[Union[str, MudStyle]], str]]) -> "MudText":
+        """
+        Builds a MudText from (style, text) pairs such as those made by disassemble_bits or
+        disassemble_runs. Each text may be a single character or a whole run.
+        """
+        parts = list()
+        spans = list()
+        offset = 0
+        for style, text in idx:
+            end = offset + len(text)
+            if style:
+                spans.append(Span(offset, end, style))
+            parts.append(text)
+            offset = end
+        return cls("".join(parts), spans=spans)
+
+    def style_at_index(self, offset: int) -> MudStyle:
+        if offset < 0:
+            offset = len(self) + offset
+        style = MudStyle.null()
+        for start, end, span_style in self._spans:
+            if end > offset >= start:
+                style = style + span_style
+        return style
+
+    def disassemble_runs(self) -> List[Tuple[MudStyle, str]]:
+        """
+        Splits the text into (style, text) runs of characters that share a style. Each run's
+        style is the same as style_at_index gives for its characters, but all of them are found
+        in one sweep over the span boundaries rather than a scan of every span per character.
+        """
+        plain = self.plain
+        length = len(plain)
+        if not length:
+            return list()
+
+        boundaries = {0, length}
+        starts = defaultdict(list)
+        ends = defaultdict(list)
+        for i, (start, end, span_style) in enumerate(self._spans):
+            start = max(start, 0)
+            end = min(end, length)
+            if start >= end:
+                continue
+            starts[start].append(i)
+            ends[end].append(i)
+            boundaries.add(start)
+            boundaries.add(end)
+
+        spans = self._spans
+        active = set()
+        runs = list()
+        points = sorted(boundaries)
+        for start, end in zip(points, points[1:]):
+            active.difference_update(ends.get(start, ()))
+            active.update(starts.get(start, ()))
             style = MudStyle.null()
-            for start, end, span_style in self._spans:
-                if end > offset >= start:
-                    style = style + span_style
-            return style
+            for i in sorted(active):
+                style = style + spans[i].style
+            if runs and hash(runs[-1][0]) == hash(style):
+                runs[-1][1].append(plain[start:end])
+            else:
+                runs.append((style, [plain[start:end]]))
+        return [(style, "".join(parts)) for style, parts in runs]
 
-        def disassemble_bits(self) -> List[Tuple[Optional[Union[str, Style, None]], str]]:
-            idx = list()
-            for i, c in enumerate(self.plain):
-                idx.append((self.style_at_index(i), c))
-            return idx
+    def disassemble_bits(self) -> List[Tuple[MudStyle, str]]:
+        return [(style, c) for style, text in self.disassemble_runs() for c in text]
 
-        def serialize(self) -> dict:
-            def ser_style(style):
-                if isinstance(style, str):
-                    style = MudStyle.parse(style)
-                if not isinstance(style, MudStyle):
-                    style = MudStyle.upgrade(style)
-                return style.serialize()
+    def serialize(self) -> dict:
+        """
+        Serializes to a dict with an interned style table: every distinct style is stored once
+        in "styles", and the text's "style" and each of its "spans" ([start, end, index]) refer
+        to it by index.
+        """
+        table = list()
+        indexes = dict()
 
-            def ser_span(span):
-                if not span.style:
-                    return None
-                return {
-                    "start": span.start,
-                    "end": span.end,
-                    "style": ser_style(span.style),
-                }
+        def ser_style(style) -> int:
+            if isinstance(style, str):
+                style = MudStyle.parse(style)
+            if not isinstance(style, MudStyle):
+                style = MudStyle.upgrade(style)
+            if (found := indexes.get(style, None)) is None:
+                found = indexes[style] = len(table)
+                table.append(style.serialize())
+            return found
 
-            out = {"text": self.plain}
+        out = {"text": self.plain}
 
-            if self.style:
-                out["style"] = ser_style(self.style)
+        if self.style:
+            out["style"] = ser_style(self.style)
 
-            out_spans = [s for span in self.spans if (s := ser_span(span))]
+        out_spans = [[span.start, span.end, ser_style(span.style)] for span in self.spans if span.style]
 
-            if out_spans:
-                out["spans"] = out_spans
+        if out_spans:
+            out["spans"] = out_spans
+        if table:
+            out["styles"] = table
 
-            return out
+        return out
 
-        @classmethod
-        def deserialize(cls, data) -> "Text":
-            text = data.get("text", None)
-            if text is None:
-                return cls("")
-            style = data.get("style", None)
+    @classmethod
+    def deserialize(cls, data) -> "MudText":
+        """
+        Reverses serialize(). Styles are taken from a shared intern cache, so identical styles
+        across messages are the same MudStyle instance. The older format, with a full style
+        dict in place of every index, is also accepted.
+        """
+        text = data.get("text", None)
+        if text is None:
+            return cls("")
+        style = data.get("style", None)
+        spans = data.get("spans", None)
+
+        if (table := data.get("styles", None)) is not None:
+            table = [intern_style(s) for s in table]
+            if style is not None:
+                style = table[style]
+            if spans:
+                spans = [Span(start, end, table[idx]) for start, end, idx in spans]
+        else:
             if style:
-                style = MudStyle(**style)
+                style = intern_style(style)
+            if spans:
+                spans = [Span(s["start"], s["end"], intern_style(s["style"])) for s in spans]
 
-            spans = data.get("spans", None)
+        return cls(text=text, style=style, spans=spans)
 
-            if spans:
-                spans = [Span(s["start"], s["end"], MudStyle(**s["style"])) for s in spans]
-
-            return cls(text=text, style=style, spans=spans)
-
-        def squish(self) -> "MudText":
-            """
-            Removes leading and trailing whitespace, and coerces all internal whitespace sequences
-            into at most a single space. Returns the results.
-            """
-            out = list()
-            matches = _RE_SQUISH.finditer(self.plain)
-            for match in matches:
-                out.append(self[match.start(): match.end()])
-            return self.__class__(" ").join(out)
-
-        def squish_spaces(self) -> "MudText":
-            """
-            Like squish, but retains newlines and tabs. Just squishes spaces.
-            """
-            out = list()
-            matches = _RE_NOTSPACE.finditer(self.plain)
-            for match in matches:
-                out.append(self[match.start(): match.end()])
-            return self.__class__(" ").join(out)
+    def squish(self) -> "MudText":
+        """
+        Removes leading and trailing whitespace, and coerces all internal whitespace sequences
+        into at most a single space. Returns the results.
+        """
+        out = list()
+        matches = _RE_SQUISH.finditer(self.plain)
+        for match in matches:
+            out.append(self[match.start(): match.end()])
+        return self.__class__(" ").join(out)
+
+    def squish_spaces(self) -> "MudText":
+        """
+        Like squish, but retains newlines and tabs. Just squishes spaces.
+        """
+        out = list()
+        matches = _RE_NOTSPACE.finditer(self.plain)
+        for match in matches:
+            out.append(self[match.start(): match.end()])
+        return self.__class__(" ").join(out)
 
 DEFAULT_STYLES = dict()
 
@@ -623,4 +785,4 @@ def test():
     print(type(s))
     print(type(t))
 
-    c.print(t)
\ No newline at end of file
+    c.print(t)
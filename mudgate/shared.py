@@ -67,6 +67,13 @@ class ConnectionDetails:
     mxp_active: bool = False
     oob: bool = False
 
+    def apply_delta(self, delta: dict):
+        """
+        Applies the contents of a DELTA message, which holds only the fields that changed.
+        """
+        for k, v in delta.items():
+            setattr(self, k, v)
+
 
 class ConnectionInMessageType(IntEnum):
     GAMEDATA = 0
@@ -75,6 +82,12 @@ class ConnectionInMessageType(IntEnum):
     MSSP = 4
     DISCONNECT = 5
     UPDATE = 6
+    DELTA = 7
+    # data: {"throttled": bool, "buffered": bytes held back, "dropped": bytes discarded so far,
+    #        "stats": the connection's OutputStats as a dict}
+    THROTTLE = 8
+    # sent to the link a client is leaving. data: {"link": name of the link it moved to}
+    MIGRATE = 9
 
 
 @dataclass_json
@@ -101,10 +114,27 @@ class ConnectionOutMessage:
 
 class LinkMessageType(IntEnum):
     EVENTS = 0
+    # from the gateway, data: {"codecs", "worker", "workers", "link", "seq", "epoch",
+    # "clients": {client_id: details}, "more": bool}. Only the first frame has the other keys; "more" is
+    # false on the last one. A resync HELLO has "resync": true and "missing": [first seq, last seq] in place
+    # of "codecs", "worker" and "workers"; its snapshot replaces every frame up to "seq".
+    # from the game server, data: {"codec": name, "ack": seq, "epoch": the epoch from our HELLO}.
     HELLO = 1
     SYSTEM = 2
     STORE = 3
     RETRIEVE = 4
+    # data: {"msg_type": ConnectionOutMessageType, "data": payload} plus either "clients": [client_id, ...]
+    # or "group": name. With neither, the message goes to every client. Only clients routed to the link
+    # that sent it receive it.
+    BROADCAST = 5
+    # data: {"name": group name, "add": [client_id, ...], "remove": [client_id, ...], "clear": bool}.
+    # Each link has its own groups.
+    GROUP = 6
+    # data: {"seq": the last EVENTS frame the game server has processed, "epoch": the epoch from our HELLO}
+    ACK = 7
+    # data: {"clients": [client_id, ...], "link": name}. Routes the clients to the named link. Only clients
+    # routed to the link that sent it are moved, and it's ignored if no link by that name is configured.
+    MIGRATE = 8
 
 
 @dataclass_json
@@ -2,12 +2,47 @@
 import os
 import sys
 import traceback
+import gc
 import asyncio
+import multiprocessing
 import yaml
 
 GAME_NAME = "mudgate"
 
 
+def setup_runtime(runtime: dict) -> bool:
+    """
+    Applies the runtime section of config.yaml. Returns whether asyncio debug mode should be on.
+    """
+    debug = runtime.get("mode", "production") == "debug"
+
+    if runtime.get("uvloop", True):
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            print("uvloop is not installed, using the default asyncio event loop.")
+
+    if (thresholds := runtime.get("gc", None)):
+        gc.set_threshold(*thresholds)
+
+    return debug
+
+
+def run_worker(config: dict, worker: int, workers: int):
+    """
+    Runs one gateway process. Sets up everything main() does first, since a spawned worker
+    inherits none of it.
+    """
+    from mudgate.rich import install
+    install()
+    debug = setup_runtime(config.get("runtime", dict()))
+    from .app import MudGate
+    if not debug:
+        gc.freeze()
+    asyncio.run(MudGate(config, worker=worker, workers=workers).run(), debug=debug)
+
+
 def main():
     from mudgate.rich import install
     install()
@@ -21,6 +56,8 @@ def main():
     except Exception:
         raise Exception("Could not import config!")
 
+    debug = setup_runtime(config.get("runtime", dict()))
+
     from .app import MudGate
     pidfile = os.path.join(".", f"{GAME_NAME}.pid")
 
@@ -29,13 +66,25 @@ def main():
         with open(pidfile, "w") as p:
             p.write(str(os.getpid()))
 
-        app_core = MudGate(config)
+        workers = config.get("workers", 1)
 
         # Step 3: Load application from core.
         #app_core.configure()
         # Step 4: Start everything up and run forever.
         print(f"running {GAME_NAME}!")
-        asyncio.run(app_core.run(), debug=True)
+        if not debug:
+            # everything loaded so far lives for the whole run; keep the collector from rescanning it.
+            gc.freeze()
+        if workers > 1:
+            procs = [multiprocessing.Process(target=run_worker, args=(config, i, workers),
+                                             name=f"{GAME_NAME}-worker-{i}") for i in range(workers)]
+            for proc in procs:
+                proc.start()
+            for proc in procs:
+                proc.join()
+        else:
+            app_core = MudGate(config)
+            asyncio.run(app_core.run(), debug=debug)
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
         print(f"UNHANDLED EXCEPTION!")
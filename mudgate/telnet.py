@@ -1,9 +1,11 @@
 import time
 
 import asyncio
-from typing import Optional, Union, Dict, Set, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List
 
-from .telnet_protocol import TelnetFrame, TelnetConnection, TelnetOutMessage, TelnetOutMessageType
+from .telnet_protocol import TelnetFrameScanner, TelnetConnection, TelnetOutMessage, TelnetOutMessageType
 from .telnet_protocol import TelnetInMessage, TelnetInMessageType
 from .shared import COLOR_MAP, ConnectionDetails, MudProtocol
 from .shared import ConnectionInMessageType, ConnectionOutMessage, ConnectionInMessage, ConnectionOutMessageType
@@ -11,17 +13,55 @@ from .shared import ConnectionInMessageType, ConnectionOutMessage, ConnectionInM
 from .conn import MudConnection
 
 
-class TelnetMudConnection(MudConnection):
+class OutputStats:
+    """
+    Backpressure metrics for one connection's output.
+    """
 
-    def __init__(self, listener, reader, writer, conn_details: ConnectionDetails):
+    __slots__ = ["held_bytes", "peak_bytes", "throttled", "dropped_bytes", "dropped_chunks"]
+
+    def __init__(self):
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        self.throttled = 0
+        self.dropped_bytes = 0
+        self.dropped_chunks = 0
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class TelnetMudConnection(MudConnection, asyncio.BufferedProtocol):
+
+    def __init__(self, listener, conn_details: ConnectionDetails):
         super().__init__(conn_details)
-        self.telnet = TelnetConnection()
+        self.telnet = TelnetConnection(mccp2=listener.mccp2)
         self.telnet_in_events: List[TelnetInMessage] = list()
         self.telnet_pending_events: List[TelnetInMessage] = list()
         self.listener = listener
-        self.reader = reader
-        self.writer = writer
-        self.in_buffer = bytearray()
+        self.transport: Optional[asyncio.Transport] = None
+        self.task: Optional[asyncio.Task] = None
+        # the transport reads straight into recv_buffer, which grows while reads keep filling it
+        # and shrinks back once they don't need the room.
+        self.recv_buffer = bytearray(listener.read_size)
+        self.recv_view = memoryview(self.recv_buffer)
+        self.small_reads = 0
+        self.in_scanner = TelnetFrameScanner()
+        # set when input arrives while an MCCP2 compression job is running.
+        self.in_deferred = False
+        # set while the transport's write buffer is over its high-water mark.
+        self.writing_paused = False
+        # uncompressed output waiting behind an MCCP2 compression job running in the executor.
+        self.compress_queue: List[bytearray] = list()
+        self.compress_task: Optional[asyncio.Task] = None
+        # uncompressed output collected until flush_output() runs at the end of the loop tick.
+        self.out_buffer = bytearray()
+        self.out_flush: Optional[asyncio.Handle] = None
+        self.out_prompt = False
+        # (uncompressed output, ends with prompt) chunks held back while the client is slow.
+        self.out_held = deque()
+        self.out_stats = OutputStats()
+        self.reading_paused = False
 
     def on_start(self):
         super().on_start()
@@ -41,21 +81,77 @@ class TelnetMudConnection(MudConnection):
         await self.process_out_event(ConnectionOutMessage(msg_type=ConnectionOutMessageType.GAMEDATA, client_id=self.conn_id,
                                                     data=data))
 
-    async def data_received(self, data: bytearray):
-        self.in_buffer.extend(data)
-
-        while (frame := TelnetFrame.parse_consume(self.in_buffer)):
-            events_buffer = self.telnet_in_events if self.started else self.telnet_pending_events
-            out_buffer = bytearray()
-            changed = self.telnet.process_frame(frame, out_buffer, events_buffer)
-            if out_buffer:
-                self.writer.write(out_buffer)
-                await self.writer.drain()
-            if changed:
-                self.update_details(changed)
-                if self.started:
-                    self.in_events.append(ConnectionInMessage(ConnectionInMessageType.UPDATE, self.conn_id,
-                                                              self.details))
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.details.host_address, self.details.host_port = transport.get_extra_info("peername")[:2]
+        transport.set_write_buffer_limits(high=self.listener.out_high, low=self.listener.out_low)
+        self.listener.app.game_clients[self.conn_id] = self
+        self.task = asyncio.create_task(self.run())
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.queue_in_event(ConnectionInMessage(ConnectionInMessageType.DISCONNECT, self.conn_id, None))
+        self.running = False
+        self.in_events_ready.set()
+        self.out_held.clear()
+        self.out_stats.held_bytes = 0
+        if self.out_flush:
+            self.out_flush.cancel()
+            self.out_flush = None
+
+    def pause_writing(self):
+        self.writing_paused = True
+
+    def resume_writing(self):
+        self.writing_paused = False
+        self.release_output()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.recv_view
+
+    def buffer_updated(self, nbytes: int):
+        self.in_scanner.feed(self.recv_view[:nbytes])
+        listener = self.listener
+        size = len(self.recv_buffer)
+        if nbytes == size:
+            self.small_reads = 0
+            if size < listener.read_max:
+                self.set_recv_buffer(min(size * 2, listener.read_max))
+        elif size > listener.read_size:
+            if nbytes > listener.read_size:
+                self.small_reads = 0
+            else:
+                self.small_reads += 1
+                if self.small_reads >= listener.read_shrink:
+                    self.small_reads = 0
+                    self.set_recv_buffer(listener.read_size)
+        self.process_input()
+
+    def set_recv_buffer(self, size: int):
+        self.recv_buffer = bytearray(size)
+        self.recv_view = memoryview(self.recv_buffer)
+
+    def process_input(self):
+        """
+        Processes everything in the scanner. Negotiation replies are compressed inline, so if
+        an MCCP2 compression job is running this waits for run_compress() to call it again.
+        """
+        self.flush_output()
+        if self.compress_task:
+            self.in_deferred = True
+            return
+
+        out_buffer, events, changed = self.telnet.process_buffer(self.in_scanner)
+        if out_buffer:
+            self.transport.write(out_buffer)
+        if events:
+            if self.started:
+                self.telnet_in_events.extend(events)
+            else:
+                self.telnet_pending_events.extend(events)
+        if changed:
+            delta = self.update_details(changed)
+            if delta and self.started:
+                self.queue_in_event(ConnectionInMessage(ConnectionInMessageType.DELTA, self.conn_id, delta))
 
         if self.telnet_in_events:
             self.process_telnet_events()
@@ -64,57 +160,57 @@ class TelnetMudConnection(MudConnection):
         self.running = True
         out_buffer = bytearray()
         self.telnet.start(out_buffer)
-        self.writer.write(out_buffer)
-        await asyncio.gather(self.run_start(), self.run_reader(), self.run_in_events())
-
-    async def run_reader(self):
-        while (data := await self.reader.read(1024)):
-            await self.data_received(data)
-        self.in_events.append(ConnectionInMessage(ConnectionInMessageType.DISCONNECT, self.conn_id, None))
-
-    async def run_in_events(self):
-        link = self.listener.app.link
-        while self.running:
-            if self.in_events:
-                msg = self.in_events.pop(0)
-                await link.inbox.put(msg)
-            else:
-                await asyncio.sleep(0.05)
+        self.transport.write(out_buffer)
+        await asyncio.gather(self.run_start(), self.run_in_events())
+        self.listener.app.game_clients.pop(self.conn_id, None)
+
+    def update_details(self, changed: dict) -> dict:
+        """
+        Applies a change dict from the TelnetConnection to self.details. Returns a dict of
+        the ConnectionDetails fields whose values actually changed.
+        """
+        details = self.details
+        delta = dict()
+
+        def set_detail(field: str, value):
+            if getattr(details, field, None) != value:
+                setattr(details, field, value)
+                delta[field] = value
 
-    def update_details(self, changed: dict):
         for k, v in changed.items():
             if k in ("local", "remote"):
                 for feature, value in v.items():
-                    setattr(self.details, feature, value)
+                    set_detail(feature, value)
             elif k == "naws":
-                self.details.width = v.get('width', 78)
-                self.details.height = v.get('height', 24)
+                set_detail("width", v.get('width', 78))
+                set_detail("height", v.get('height', 24))
             elif k == "mccp2":
                 for feature, val in v.items():
                     if feature == "active":
-                        self.details.mccp2_active = val
+                        set_detail("mccp2_active", val)
             elif k == "mccp3":
                 for feature, val in v.items():
                     if feature == "active":
-                        self.details.mccp3_active = val
+                        set_detail("mccp3_active", val)
             elif k == "mtts":
                 for feature, val in v.items():
                     if feature in ("ansi", "xterm256", "truecolor"):
                         if not val:
-                            self.details.color = None
+                            set_detail("color", None)
                         else:
                             mapped = COLOR_MAP[feature]
-                            if not self.details.color:
-                                self.details.color = mapped
+                            if not details.color:
+                                set_detail("color", mapped)
                             else:
-                                if mapped > self.details.color:
-                                    self.details.color = mapped
+                                if mapped > details.color:
+                                    set_detail("color", mapped)
                     else:
-                        setattr(self.details, feature, val)
+                        set_detail(feature, val)
 
         self.console._mxp = self.details.mxp_active
         self.console._color_system = self.details.color
         self.console._width = self.details.width
+        return delta
 
     def telnet_in_to_conn_in(self, ev: TelnetInMessage):
         if ev.msg_type == TelnetInMessageType.LINE:
@@ -131,7 +227,7 @@ class TelnetMudConnection(MudConnection):
         for ev in self.telnet_in_events:
             msg = self.telnet_in_to_conn_in(ev)
             if msg:
-                self.in_events.append(msg)
+                self.queue_in_event(msg)
         self.telnet_in_events.clear()
 
     msg_map = {
@@ -141,10 +237,146 @@ class TelnetMudConnection(MudConnection):
     }
 
     async def send_text_data(self, mode: str, data: str):
+        """
+        Adds text to out_buffer. Everything sent in the same loop tick, such as the contents
+        of a link EVENTS batch, is compressed and written together by flush_output(). Prompts
+        are flushed at once.
+        """
         msg_type = self.msg_map.get(mode)
-        out = bytearray()
-        self.telnet.process_out_message(TelnetOutMessage(msg_type, data), out)
-        self.writer.write(out)
+        self.telnet.process_out_message(TelnetOutMessage(msg_type, data), self.out_buffer, compress=False)
+        if msg_type == TelnetOutMessageType.PROMPT:
+            self.out_prompt = True
+            self.flush_output()
+        elif self.out_flush is None:
+            self.out_flush = asyncio.get_running_loop().call_soon(self.flush_output)
+
+    def flush_output(self):
+        if self.out_flush:
+            self.out_flush.cancel()
+            self.out_flush = None
+        if self.out_buffer:
+            out = self.out_buffer
+            self.out_buffer = bytearray()
+            prompt = self.out_prompt
+            self.out_prompt = False
+            self.write_output(out, prompt)
+
+    def write_output(self, data: bytearray, prompt: bool = False):
+        """
+        Sends output unless the client isn't keeping up. Once the transport's write buffer
+        passes the listener's out_high mark, output is held back (uncompressed) until it
+        drains below out_low and resume_writing() releases it. The game is sent a THROTTLE
+        event when holding starts and another when it ends.
+        """
+        if self.transport.is_closing():
+            return
+        if self.out_held or self.writing_paused:
+            self.hold_output(data, prompt)
+        else:
+            self.send_output(data)
+
+    def hold_output(self, data: bytearray, prompt: bool):
+        listener = self.listener
+        stats = self.out_stats
+        if listener.out_policy == "pause" and self.out_held and stats.held_bytes + len(data) > listener.out_limit:
+            # no room left, so stop reading the client's input until release_output() catches up.
+            stats.dropped_bytes += len(data)
+            stats.dropped_chunks += 1
+            if not self.reading_paused:
+                self.reading_paused = True
+                self.transport.pause_reading()
+            return
+        starting = not self.out_held
+        self.out_held.append((data, prompt))
+        stats.held_bytes += len(data)
+        if stats.held_bytes > stats.peak_bytes:
+            stats.peak_bytes = stats.held_bytes
+        if starting:
+            stats.throttled += 1
+            self.notify_throttle(True)
+
+        if stats.held_bytes <= listener.out_limit:
+            return
+        if listener.out_policy == "disconnect":
+            self.out_held.clear()
+            stats.held_bytes = 0
+            # close() would wait for the write buffer to drain, which a stalled client never does.
+            self.transport.abort()
+        elif listener.out_policy != "pause":
+            kept = deque()
+            while self.out_held and stats.held_bytes > listener.out_limit:
+                chunk, chunk_prompt = self.out_held.popleft()
+                if chunk_prompt:
+                    kept.append((chunk, chunk_prompt))
+                    continue
+                stats.held_bytes -= len(chunk)
+                stats.dropped_bytes += len(chunk)
+                stats.dropped_chunks += 1
+            kept.extend(self.out_held)
+            self.out_held = kept
+
+    def release_output(self):
+        """
+        Sends held output while the transport will take it. Called as the client catches up;
+        once everything is sent, reading resumes (if the pause policy stopped it) and the game
+        is told the client is no longer throttled.
+        """
+        if not self.out_held or self.transport.is_closing():
+            return
+        stats = self.out_stats
+        while self.out_held and not self.writing_paused:
+            data, prompt = self.out_held.popleft()
+            stats.held_bytes -= len(data)
+            self.send_output(data)
+        if self.out_held:
+            return
+        if self.reading_paused:
+            self.reading_paused = False
+            self.transport.resume_reading()
+        self.notify_throttle(False)
+
+    def notify_throttle(self, throttled: bool):
+        if self.started:
+            stats = self.out_stats
+            self.queue_in_event(ConnectionInMessage(ConnectionInMessageType.THROTTLE, self.conn_id, {
+                "throttled": throttled, "buffered": stats.held_bytes, "dropped": stats.dropped_bytes,
+                "stats": stats.to_dict()}))
+
+    def send_output(self, data: bytearray):
+        """
+        Compresses (if MCCP2 is active) and writes output. Output at least as large as the
+        listener's compress_threshold is compressed in its executor so it doesn't stall the
+        event loop. Anything sent while a job is running waits behind it, to keep the order.
+        """
+        telnet = self.telnet
+        if not telnet.out_compressor:
+            self.transport.write(data)
+            return
+        threshold = self.listener.compress_threshold
+        if self.compress_task is None and (not threshold or len(data) < threshold):
+            self.transport.write(telnet.compress_bytes(data))
+            return
+        self.compress_queue.append(data)
+        if self.compress_task is None:
+            self.compress_task = asyncio.create_task(self.run_compress())
+
+    async def run_compress(self):
+        loop = asyncio.get_running_loop()
+        threshold = self.listener.compress_threshold
+        try:
+            while self.compress_queue:
+                data = b"".join(self.compress_queue)
+                self.compress_queue.clear()
+                if len(data) >= threshold:
+                    data = await loop.run_in_executor(self.listener.compress_executor, self.telnet.compress_bytes, data)
+                else:
+                    data = self.telnet.compress_bytes(data)
+                self.transport.write(data)
+        finally:
+            self.compress_task = None
+        if self.in_deferred:
+            self.in_deferred = False
+            self.process_input()
 
     async def send_oob_data(self, cmd: str, *args, **kwargs):
         if not self.details.oob:
@@ -154,7 +386,7 @@ class TelnetMudConnection(MudConnection):
         out = bytearray()
         msg = TelnetOutMessage(TelnetOUtMessageType.MSSP, kwargs)
         self.telnet.process_out_message(TelnetOutMessage(msg_type, data), out)
-        self.writer.write(out)
+        self.transport.write(out)
 
     async def process_out_mssp(self, ev: ConnectionOutMessage):
         pass
@@ -166,11 +398,38 @@ class TelnetManager:
     protocol = TelnetMudConnection
     protocol_name = "TELNET"
 
-    def __init__(self, app, interface: str, plain: Optional[int], tls: Optional[int]):
+    def __init__(self, app, interface: str, plain: Optional[int], tls: Optional[int],
+                 mccp2: Optional[Dict[str, int]] = None, compress_threshold: int = 0, compress_workers: int = 0,
+                 backpressure: Optional[Dict] = None, read_size: int = 16384, read_max: int = 262144,
+                 read_shrink: int = 16):
         self.app = app
         self.interface = interface
         self.plain = plain
         self.tls = tls
+        self.mccp2 = mccp2
+        # outputs of at least compress_threshold bytes are compressed in compress_executor.
+        # 0 for either disables this, and everything is compressed on the event loop.
+        self.compress_threshold = compress_threshold if compress_workers > 0 else 0
+        self.compress_executor = None
+        if self.compress_threshold > 0:
+            self.compress_executor = ThreadPoolExecutor(max_workers=compress_workers,
+                                                        thread_name_prefix="mccp2")
+        # output is held back once a client's write buffer reaches out_high bytes, and released
+        # once it's below out_low. Past out_limit held bytes, out_policy is applied:
+        # "drop" discards the oldest non-prompt output, "pause" discards only what doesn't fit and
+        # stops reading the client's input until the backlog clears, "disconnect" closes the
+        # connection.
+        backpressure = backpressure or dict()
+        self.out_high = backpressure.get("high", 262144)
+        self.out_low = backpressure.get("low", 65536)
+        self.out_limit = backpressure.get("limit", 4194304)
+        self.out_policy = backpressure.get("policy", "drop")
+        # each connection's receive buffer starts at read_size bytes and doubles, up to read_max,
+        # whenever a single read fills it. After read_shrink reads in a row that would have fit
+        # in read_size, it goes back to read_size.
+        self.read_size = read_size
+        self.read_max = max(read_max, read_size)
+        self.read_shrink = max(read_shrink, 1)
         self.protocol.listener = self
         self.server_plain = None
         self.server_tls = None
@@ -179,25 +438,26 @@ class TelnetManager:
         await asyncio.gather(self.run_plain(), self.run_tls())
 
     async def setup(self):
+        loop = asyncio.get_running_loop()
         kwargs = {"start_serving": False, "host": self.interface}
+        if self.app.workers > 1:
+            # every worker binds the same ports and the kernel spreads connections between them.
+            kwargs["reuse_port"] = True
         if isinstance(self.plain, int):
-            self.server_plain = await asyncio.start_server(self.accept_plain, port=self.plain, **kwargs)
+            self.server_plain = await loop.create_server(self.accept_plain, port=self.plain, **kwargs)
         if isinstance(self.tls, int):
-            self.server_tls = await asyncio.start_server(self.accept_tls, port=self.tls, ssl=self.app.tls_context, **kwargs)
+            self.server_tls = await loop.create_server(self.accept_tls, port=self.tls, ssl=self.app.tls_context, **kwargs)
 
-    def accept_telnet(self, reader, writer, tls: bool):
-        addr, port = writer.get_extra_info("peername")
-        conn_details = ConnectionDetails(client_id=self.app.generate_id("telnets" if tls else "telnet"), tls=tls, protocol=MudProtocol.TELNET,
-                                         host_address=addr, host_port=port, connected=time.time())
-        prot = self.protocol(self, reader, writer, conn_details)
-        self.app.game_clients[prot.conn_id] = prot
-        return prot.run()
+    def accept_telnet(self, tls: bool):
+        conn_details = ConnectionDetails(client_id=self.app.generate_id("telnets" if tls else "telnet"), tls=tls,
+                                         protocol=MudProtocol.TELNET, connected=time.time())
+        return self.protocol(self, conn_details)
 
-    def accept_plain(self, reader, writer):
-        return self.accept_telnet(reader, writer, False)
+    def accept_plain(self):
+        return self.accept_telnet(False)
 
-    def accept_tls(self, reader, writer):
-        return self.accept_telnet(reader, writer, True)
+    def accept_tls(self):
+        return self.accept_telnet(True)
 
     async def run_plain(self):
         if self.server_plain:
@@ -206,3 +466,4 @@ class TelnetManager:
     async def run_tls(self):
         if self.server_tls:
             await self.server_tls.serve_forever()
+
@@ -66,6 +66,9 @@ class TC(IntEnum):
 NEGOTIATORS = (TC.WILL, TC.WONT, TC.DO, TC.DONT)
 ACK_OPPOSITES = {TC.WILL: TC.DO, TC.DO: TC.WILL}
 NEG_OPPOSITES = {TC.WILL: TC.DONT, TC.DO: TC.WONT}
+IAC_SE = bytes([TC.IAC, TC.SE])
+# what an escaped IAC IAC stands for in the data.
+IAC_DATA = bytes([TC.IAC])
 
 
 class TelnetInMessageType(IntEnum):
@@ -103,15 +106,16 @@ class TelnetOutMessage:
 
 
 class _InternalMsg:
-    __slots__ = ["protocol", "out_buffer", "out_events", "changed"]
+    __slots__ = ["protocol", "out_buffer", "out_events", "changed", "compress"]
 
     def __init__(
-        self, protocol, out_buffer: bytearray, out_events: List[TelnetInMessage]
+        self, protocol, out_buffer: bytearray, out_events: List[TelnetInMessage], compress: bool = True
     ):
         self.protocol = protocol
         self.out_buffer: bytearray = out_buffer
         self.out_events: List[TelnetInMessage] = out_events
         self.changed: Dict = defaultdict(dict)
+        self.compress = compress
 
 
 class TelnetFrameType(IntEnum):
@@ -133,38 +137,49 @@ class TelnetFrame:
 
     @classmethod
     def parse(
-        cls, buffer: Union[bytes, bytearray]
+        cls,
+        buffer: Union[bytes, bytearray],
+        offset: int = 0,
+        view: Optional[memoryview] = None,
     ) -> Tuple[Optional["TelnetFrame"], int]:
-        if not len(buffer) > 0:
+        """
+        Parse a single frame from buffer, starting at offset. Returns the frame (or None if more
+        data is needed) and the number of bytes it consumed.
+
+        If view is provided (a memoryview over buffer), DATA frames will be slices of it rather
+        than copies.
+        """
+        available = len(buffer) - offset
+        if not available > 0:
             return None, 0
-        if buffer[0] == TC.IAC:
-            if len(buffer) < 2:
+        if buffer[offset] == TC.IAC:
+            if available < 2:
                 # not enough bytes available to do anything.
                 return None, 0
             else:
-                if buffer[1] == TC.IAC:
-                    return cls(TelnetFrameType.DATA, TC.IAC), 2
-                elif buffer[1] in NEGOTIATORS:
-                    if len(buffer) > 2:
-                        option = TC.from_int(buffer[2])
+                if buffer[offset + 1] == TC.IAC:
+                    return cls(TelnetFrameType.DATA, IAC_DATA), 2
+                elif buffer[offset + 1] in NEGOTIATORS:
+                    if available > 2:
+                        option = TC.from_int(buffer[offset + 2])
                         return (
-                            cls(TelnetFrameType.NEGOTIATION, (TC(buffer[1]), option)),
+                            cls(
+                                TelnetFrameType.NEGOTIATION,
+                                (TC(buffer[offset + 1]), option),
+                            ),
                             3,
                         )
                     else:
                         # it's a negotiation, but we need more.
                         return None, 0
-                elif buffer[1] == TC.SB:
-                    if len(buffer) >= 5:
-                        match = bytearray()
-                        match.append(TC.IAC)
-                        match.append(TC.SE)
-                        idx = buffer.find(match)
+                elif buffer[offset + 1] == TC.SB:
+                    if available >= 5:
+                        idx = buffer.find(IAC_SE, offset + 2)
                         if idx == -1:
                             return None, 0
                         # hooray, idx is the beginning of our ending IAC SE!
-                        option = TC.from_int(buffer[2])
-                        data = buffer[3:idx]
+                        option = TC.from_int(buffer[offset + 2])
+                        data = bytes(buffer[offset + 3 : idx])
                         return (
                             cls(TelnetFrameType.SUBNEGOTIATION, (option, data)),
                             5 + len(data),
@@ -173,18 +188,20 @@ class TelnetFrame:
                         # it's a subnegotiate, but we need more.
                         return None, 0
                 else:
-                    option = TC.from_int(buffer[1])
+                    option = TC.from_int(buffer[offset + 1])
                     return cls(TelnetFrameType.COMMAND, option), 2
         else:
             # we are dealing with 'just data!'
-            idx = buffer.find(TC.IAC)
+            idx = buffer.find(TC.IAC, offset)
             if idx == -1:
                 # no idx. consume entire remaining buffer.
-                return cls(TelnetFrameType.DATA, bytes(buffer)), len(buffer)
+                idx = len(buffer)
+            # There may be an IAC ahead - consume up to it, and loop.
+            if view is not None:
+                data = view[offset:idx]
             else:
-                # There is an IAC ahead - consume up to it, and loop.
-                data = buffer[:idx]
-                return cls(TelnetFrameType.DATA, data), len(data)
+                data = bytes(buffer[offset:idx])
+            return cls(TelnetFrameType.DATA, data), idx - offset
 
     @classmethod
     def parse_consume(cls, buffer: bytearray) -> Optional["TelnetFrame"]:
@@ -195,6 +212,46 @@ class TelnetFrame:
         return None
 
 
+class TelnetFrameScanner:
+    """
+    Incrementally parses TelnetFrames out of received data using a read cursor.
+
+    Unlike TelnetFrame.parse_consume, which deletes each frame from the front of the buffer as
+    it's parsed, the scanner only advances an offset and compacts the buffer once per feed().
+    DATA frames are yielded as memoryview slices of the buffer; they are only valid until
+    the next call to feed().
+    """
+
+    __slots__ = ["buffer", "offset"]
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.buffer) - self.offset
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]):
+        if self.offset:
+            # Replace rather than resize the buffer, as memoryviews of it may still be alive.
+            remaining = self.buffer[self.offset :]
+            remaining.extend(data)
+            self.buffer = remaining
+            self.offset = 0
+        else:
+            self.buffer.extend(data)
+
+    def __iter__(self):
+        buffer = self.buffer
+        view = memoryview(buffer)
+        while True:
+            frame, size = TelnetFrame.parse(buffer, self.offset, view)
+            if not frame:
+                return
+            self.offset += size
+            yield frame
+
+
 class TelnetOptionPerspective:
     __slots__ = ["enabled", "negotiating", "heard_answer", "asked"]
 
@@ -323,13 +380,40 @@ class MCCP2Handler(TelnetOptionHandler):
     def enable_local(self, imsg: _InternalMsg):
         imsg.changed["mccp2"]["active"] = True
         imsg.protocol.send_subnegotiate(self.opcode, [], imsg)
-        imsg.protocol.out_compressor = zlib.compressobj(9)
+        imsg.protocol.out_compressor = imsg.protocol.make_compressor()
 
     def disable_local(self, imsg: _InternalMsg):
         imsg.changed["mccp2"]["active"] = False
         imsg.protocol.out_compressor = None
 
 
+def mccp2_memory(wbits: int, memlevel: int) -> int:
+    """
+    Approximate bytes of memory a zlib compressor uses with these settings, per zlib's zconf.h.
+    """
+    return (1 << (wbits + 2)) + (1 << (memlevel + 9))
+
+
+def mccp2_settings(level: int = 6, wbits: int = 15, memlevel: int = 8, max_memory: int = 0) -> Tuple[int, int, int]:
+    """
+    Clamps MCCP2 compressor settings to what zlib accepts, then shrinks the window and memLevel
+    (alternately, largest first) until the compressor fits within max_memory bytes.
+    A max_memory of 0 means no cap.
+
+    Returns (level, wbits, memlevel).
+    """
+    level = min(max(level, 0), 9)
+    wbits = min(max(wbits, 9), 15)
+    memlevel = min(max(memlevel, 1), 9)
+    if max_memory > 0:
+        while mccp2_memory(wbits, memlevel) > max_memory and (wbits > 9 or memlevel > 1):
+            if wbits > 9 and (wbits + 2 >= memlevel + 9 or memlevel == 1):
+                wbits -= 1
+            else:
+                memlevel -= 1
+    return level, wbits, memlevel
+
+
 class MTTSHandler(TelnetOptionHandler):
     opcode = TC.MTTS
     opname = "mtts"
@@ -584,15 +668,21 @@ class TelnetConnection:
         "handshakes",
         "app_linemode",
         "sga",
+        "mccp2_settings",
     ]
 
-    def __init__(self, app_linemode: bool = True, sga: bool = True):
+    def __init__(self, app_linemode: bool = True, sga: bool = True, mccp2: Optional[Dict[str, int]] = None):
         self.cmdbuff = bytearray()
         self.handlers = {hc.opcode: hc() for hc in self.handler_classes}
         self.out_compressor = None
         self.handshakes = TelnetHandshakeHolder()
         self.app_linemode = app_linemode
         self.sga = sga
+        self.mccp2_settings = mccp2_settings(**(mccp2 or dict()))
+
+    def make_compressor(self):
+        level, wbits, memlevel = self.mccp2_settings
+        return zlib.compressobj(level, zlib.DEFLATED, wbits, memlevel)
 
     def start(self, out: bytearray):
         for k, v in self.handlers.items():
@@ -647,8 +737,12 @@ class TelnetConnection:
     def send_gmcp(self, data, imsg: _InternalMsg):
         self.handlers[TC.GMCP].send(data, imsg)
 
-    def process_out_message(self, msg: TelnetOutMessage, out_buffer: bytearray):
-        imsg = _InternalMsg(self, out_buffer, list())
+    def process_out_message(self, msg: TelnetOutMessage, out_buffer: bytearray, compress: bool = True):
+        """
+        Writes msg to out_buffer. If compress is False, the bytes are left uncompressed even if
+        MCCP2 is active, and the caller must pass them through compress_bytes() itself.
+        """
+        imsg = _InternalMsg(self, out_buffer, list(), compress=compress)
 
         if msg.msg_type == TelnetOutMessageType.LINE:
             self.send_line(msg.data, imsg)
@@ -671,7 +765,35 @@ class TelnetConnection:
         self, msg: TelnetFrame, out_buffer: bytearray, out_events: List[TelnetInMessage]
     ) -> dict:
         imsg = _InternalMsg(self, out_buffer, out_events)
+        self._process_frame(msg, imsg)
 
+        if len(imsg.out_buffer):
+            if not self.sga:
+                self.send_bytes(bytes([TC.GA]), imsg)
+
+        return imsg.changed
+
+    def process_buffer(
+        self, buffer: TelnetFrameScanner
+    ) -> Tuple[bytearray, List[TelnetInMessage], dict]:
+        """
+        Process every complete frame available in buffer in a single pass.
+
+        Returns the bytes to send back to the client, the TelnetInMessages that were generated,
+        and the merged change dict for all frames. Incomplete trailing data is left in buffer.
+        """
+        imsg = _InternalMsg(self, bytearray(), list())
+
+        for frame in buffer:
+            self._process_frame(frame, imsg)
+
+        if len(imsg.out_buffer):
+            if not self.sga:
+                self.send_bytes(bytes([TC.GA]), imsg)
+
+        return imsg.out_buffer, imsg.out_events, imsg.changed
+
+    def _process_frame(self, msg: TelnetFrame, imsg: _InternalMsg):
         if msg.msg_type == TelnetFrameType.DATA:
             self.handle_data(msg.data, imsg)
         elif msg.msg_type == TelnetFrameType.COMMAND:
@@ -681,30 +803,24 @@ class TelnetConnection:
         elif msg.msg_type == TelnetFrameType.SUBNEGOTIATION:
             self.subnegotiate(msg.data[0], msg.data[1], imsg)
 
-        if len(imsg.out_buffer):
-            if not self.sga:
-                self.send_bytes(bytes([TC.GA]), imsg)
-
-        return imsg.changed
-
     def handle_command(self, cmd, imsg: _InternalMsg):
         pass
 
     def handle_data(self, data: Union[bytes, bytearray], imsg: _InternalMsg):
         if self.app_linemode:
-            self.cmdbuff.extend(data)
-            while True:
-                idx = self.cmdbuff.find(TC.LF)
-                if idx == -1:
-                    break
-                found = self.cmdbuff[:idx]
-                self.cmdbuff = self.cmdbuff[idx + 1 :]
-                if found.endswith(b"\r"):
-                    del found[-1]
-                if found:
+            cmdbuff = self.cmdbuff
+            cmdbuff.extend(data)
+            # scan with a cursor and trim once, so a large paste isn't re-copied for every line.
+            start = 0
+            while (idx := cmdbuff.find(TC.LF, start)) != -1:
+                end = idx - 1 if idx > start and cmdbuff[idx - 1] == TC.CR else idx
+                if end > start:
                     imsg.out_events.append(
-                        TelnetInMessage(TelnetInMessageType.LINE, found)
+                        TelnetInMessage(TelnetInMessageType.LINE, cmdbuff[start:end])
                     )
+                start = idx + 1
+            if start:
+                del cmdbuff[:start]
         else:
             imsg.out_events.append(
                 TelnetInMessage(TelnetInMessageType.DATA, bytes(data))
@@ -714,8 +830,8 @@ class TelnetConnection:
         handler = self.handlers.get(option, None)
         if handler:
             handler.negotiate(cmd, imsg)
-        else:
-            response = NEG_OPPOSITES.get(cmd, None)
+        elif (response := NEG_OPPOSITES.get(cmd, None)) is not None:
+            # refuse a WILL or DO for an option we don't know; a WONT or DONT needs no answer.
             self.send_negotiate(response, option, imsg)
 
     def subnegotiate(self, option: int, data: bytes, imsg: _InternalMsg):
@@ -732,9 +848,19 @@ class TelnetConnection:
         out.extend([TC.IAC, TC.SE])
         self.send_bytes(out, imsg)
 
-    def send_bytes(self, data: Union[bytes, bytearray], imsg: _InternalMsg):
+    def compress_bytes(self, data: Union[bytes, bytearray]) -> bytes:
+        """
+        Compresses data with the MCCP2 stream, if it's active. zlib releases the GIL while it
+        works, so this may be run in a thread, as long as calls stay in order.
+        """
         if self.out_compressor:
-            data = self.out_compressor.compress(data) + self.out_compressor.flush(
+            return self.out_compressor.compress(data) + self.out_compressor.flush(
                 zlib.Z_SYNC_FLUSH
             )
+        return data
+
+    def send_bytes(self, data: Union[bytes, bytearray], imsg: _InternalMsg):
+        if imsg.compress and self.out_compressor:
+            data = self.compress_bytes(data)
         imsg.out_buffer.extend(data)
+
@@ -1,4 +1,6 @@
 import importlib
+import itertools
+import time
 import uuid
 import typing
 import random
@@ -217,8 +219,36 @@ def partial_match(
             return candidate
 
 
-def generate_name(prefix: str, existing, gen_length: int = 20):
-    attempt = f"{prefix}{''.join(random.choices(string.ascii_letters + string.digits, k=gen_length))}"
-    while attempt in existing:
-        attempt = f"{prefix}{''.join(random.choices(string.ascii_letters + string.digits, k=gen_length))}"
-    return attempt
+BASE62 = string.digits + string.ascii_letters
+
+
+def encode_base62(number: int, width: int = 0) -> str:
+    """
+    Encodes a non-negative integer in base 62, left-padded with zeroes to width characters.
+    """
+    out = list()
+    while number:
+        number, digit = divmod(number, 62)
+        out.append(BASE62[digit])
+    return "".join(reversed(out)).rjust(width, "0") or "0"
+
+
+class IdGenerator:
+    """
+    Hands out short unique IDs without checking them against anything.
+
+    Every ID is the prefix, a fixed-width nonce picked at boot (the boot time, the worker index
+    and some random bits), and a counter. The counter makes IDs unique within one boot and the
+    nonce makes them unique across restarts and workers, so stale IDs can't come back.
+    """
+
+    __slots__ = ["nonce", "counter"]
+
+    def __init__(self, worker: int = 0):
+        self.nonce = f"{encode_base62(int(time.time()), 6)}{encode_base62(worker, 2)}" \
+                     f"{encode_base62(random.randrange(62 ** 4), 4)}"
+        self.counter = itertools.count()
+
+    def generate(self, prefix: str) -> str:
+        return f"{prefix}_{self.nonce}{encode_base62(next(self.counter))}"
+
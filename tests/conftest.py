@@ -0,0 +1,4 @@
+from mudgate.rich import install
+
+# MudGate's Rich patches have to be in place before anything builds a Console, Style or Text.
+install()
@@ -0,0 +1,319 @@
+"""
+Tests for the link to the game server, driven through stub websockets.
+"""
+import asyncio
+
+import ujson
+
+from mudgate.link import LinkInbox, LinkManager, LinkState
+from mudgate.shared import ConnectionDetails, ConnectionInMessage, ConnectionInMessageType
+from mudgate.utils import IdGenerator
+
+
+class StubClient:
+    def __init__(self, client_id: str):
+        self.details = ConnectionDetails(client_id=client_id, connected=0.0)
+        self.started = True
+
+
+class StubApp:
+    worker = 0
+    workers = 1
+
+    def __init__(self, clients: int = 0):
+        self.ids = IdGenerator()
+        self.game_clients = {f"c{i}": StubClient(f"c{i}") for i in range(clients)}
+        self.states = list()
+        self.dropped = list()
+
+    def on_link_state(self, channel, old, new):
+        self.states.append(new)
+
+    def on_input_dropped(self, client):
+        self.dropped.append(client.details.client_id)
+
+
+class StubWebSocket:
+    """
+    Records what the gateway sends, and hands it frames pushed with feed().
+    """
+
+    def __init__(self):
+        self.sent = list()
+        self.incoming = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, data):
+        self.sent.append(data)
+        await asyncio.sleep(0)
+
+    def feed(self, msg_type: int, data):
+        self.incoming.put_nowait(ujson.dumps({"msg_type": msg_type, "process_id": 1, "data": data}))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.incoming.get()
+
+    async def wait_sent(self, count: int):
+        while len(self.sent) < count:
+            await asyncio.sleep(0)
+
+    def frames(self) -> list:
+        return [ujson.loads(frame) for frame in self.sent]
+
+
+def make_manager(clients: int = 0, **kwargs) -> LinkManager:
+    return LinkManager(StubApp(clients), "127.0.0.1", 0, **kwargs)
+
+
+def test_reconnect_while_sending_hello():
+    async def main():
+        manager = make_manager(clients=50, hello_chunk=1)
+        old_ws, new_ws = StubWebSocket(), StubWebSocket()
+        old = asyncio.create_task(manager.handle_ws(old_ws, "/"))
+        # a few HELLO frames out of 50.
+        for i in range(5):
+            await asyncio.sleep(0)
+        assert 0 < len(old_ws.sent) < 50
+        new = asyncio.create_task(manager.handle_ws(new_ws, "/"))
+        await asyncio.wait_for(new_ws.wait_sent(50), 5)
+        await asyncio.sleep(0)
+        assert old.done()
+        assert manager.default.link is not None and manager.default.link.ws is new_ws
+        assert manager.default.state == LinkState.CONNECTED
+        hello = new_ws.frames()
+        assert sum(len(frame["data"]["clients"]) for frame in hello) == 50
+        assert not hello[-1]["data"]["more"]
+        new.cancel()
+
+    asyncio.run(main())
+
+
+def test_migrate_only_moves_clients_the_source_owns():
+    manager = make_manager(clients=2, link_names=["blue", "red"])
+    blue = manager.channels["blue"]
+    red = manager.channels["red"]
+    assert manager.migrate(["c0"], "blue", source=manager.default)
+    assert manager.route("c0") is blue
+    # red doesn't own c0 or c1, so neither moves.
+    assert manager.migrate(["c0", "c1"], "red", source=red)
+    assert manager.route("c0") is blue
+    assert manager.route("c1") is manager.default
+    assert not manager.migrate(["c1"], "nowhere", source=manager.default)
+    assert "nowhere" not in manager.channels
+
+
+def test_malformed_messages_are_dropped():
+    async def main():
+        manager = make_manager(clients=2, link_names=["blue"])
+        ws = StubWebSocket()
+        task = asyncio.create_task(manager.handle_ws(ws, "/"))
+        ws.incoming.put_nowait("not json")
+        ws.incoming.put_nowait(ujson.dumps({"msg_type": 99, "process_id": 1, "data": None}))
+        ws.feed(8, {"clients": "c0"})
+        ws.feed(8, {"link": "blue"})
+        ws.feed(8, None)
+        ws.feed(6, {"add": ["c0"]})
+        ws.feed(6, {"name": ["x"], "add": ["c0"]})
+        ws.feed(5, {"clients": ["c0"]})
+        # still up: a valid message after all of those is handled.
+        ws.feed(6, {"name": "all", "add": ["c0", "c1"]})
+        ws.feed(8, {"clients": ["c1"], "link": "blue"})
+        while ws.incoming.qsize():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert not task.done()
+        assert manager.default.groups == {"all": {"c0", "c1"}}
+        assert manager.route("c1") is manager.channels["blue"]
+        assert manager.route("c0") is manager.default
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def test_unknown_link_paths_are_refused():
+    async def main():
+        manager = make_manager(clients=1, link_names=["blue"])
+        ws = StubWebSocket()
+        await asyncio.wait_for(manager.handle_ws(ws, "/elsewhere"), 5)
+        assert ws.closed and not ws.sent
+        assert set(manager.channels) == {"default", "blue"}
+        blue_ws = StubWebSocket()
+        task = asyncio.create_task(manager.handle_ws(blue_ws, "/blue"))
+        await asyncio.wait_for(blue_ws.wait_sent(1), 5)
+        assert manager.channels["blue"].link.ws is blue_ws
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def test_only_dropped_input_is_reported():
+    manager = make_manager(clients=2, inbox_client_cap=1, inbox_control_cap=1)
+    gamedata = ConnectionInMessage(ConnectionInMessageType.GAMEDATA, "c0", (("line", ("look",), dict()),))
+    manager.put(gamedata)
+    manager.put(gamedata)
+    assert manager.app.dropped == ["c0"]
+    manager.put(ConnectionInMessage(ConnectionInMessageType.READY, "c1", None))
+    manager.put(ConnectionInMessage(ConnectionInMessageType.READY, "c0", None))
+    assert manager.default.inbox.stats.overflowed == 2
+    assert manager.app.dropped == ["c0"]
+
+
+def message(msg_type: ConnectionInMessageType, client_id: str, data=None) -> ConnectionInMessage:
+    return ConnectionInMessage(msg_type, client_id, data)
+
+
+def line(client_id: str, text: str) -> ConnectionInMessage:
+    return message(ConnectionInMessageType.GAMEDATA, client_id, (("line", (text,), dict()),))
+
+
+def drain(inbox: LinkInbox) -> list:
+    out = list()
+    while not inbox.empty():
+        msg = inbox.get_nowait()
+        out.append((msg.msg_type, msg.client_id, msg.data))
+    return out
+
+
+def test_inbox_sends_control_first_then_clients_in_turn():
+    inbox = LinkInbox()
+    for text in ("a1", "a2", "a3"):
+        inbox.put_nowait(line("a", text))
+    inbox.put_nowait(line("b", "b1"))
+    inbox.put_nowait(message(ConnectionInMessageType.READY, "c"))
+    assert [(msg_type, client_id) for msg_type, client_id, data in drain(inbox)] == [
+        (ConnectionInMessageType.READY, "c"),
+        (ConnectionInMessageType.GAMEDATA, "a"),
+        (ConnectionInMessageType.GAMEDATA, "b"),
+        (ConnectionInMessageType.GAMEDATA, "a"),
+        (ConnectionInMessageType.GAMEDATA, "a"),
+    ]
+    assert inbox.stats.sent == 5 and not len(inbox)
+
+
+def test_inbox_caps():
+    inbox = LinkInbox(max_size=3, client_cap=2, control_cap=1)
+    assert inbox.put_nowait(line("a", "1"))
+    assert inbox.put_nowait(line("a", "2"))
+    assert not inbox.put_nowait(line("a", "3"))
+    assert inbox.put_nowait(line("b", "1"))
+    assert not inbox.put_nowait(line("c", "1"))
+    assert inbox.put_nowait(message(ConnectionInMessageType.READY, "a"))
+    assert not inbox.put_nowait(message(ConnectionInMessageType.READY, "b"))
+    # a DISCONNECT gets past every cap.
+    assert inbox.put_nowait(message(ConnectionInMessageType.DISCONNECT, "c"))
+    assert inbox.put_nowait(message(ConnectionInMessageType.DISCONNECT, "a"))
+    assert inbox.stats.overflowed == 3
+    assert len(inbox) == 6
+
+
+def test_inbox_disconnect_follows_queued_input():
+    inbox = LinkInbox()
+    inbox.put_nowait(line("a", "1"))
+    inbox.put_nowait(line("a", "2"))
+    inbox.put_nowait(message(ConnectionInMessageType.DISCONNECT, "a"))
+    inbox.put_nowait(message(ConnectionInMessageType.DISCONNECT, "b"))
+    assert [(msg_type, client_id) for msg_type, client_id, data in drain(inbox)] == [
+        (ConnectionInMessageType.DISCONNECT, "b"),
+        (ConnectionInMessageType.GAMEDATA, "a"),
+        (ConnectionInMessageType.GAMEDATA, "a"),
+        (ConnectionInMessageType.DISCONNECT, "a"),
+    ]
+
+
+def test_inbox_coalesces_detail_changes():
+    inbox = LinkInbox()
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"width": 80}))
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"height": 24}))
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "b", {"width": 100}))
+    inbox.put_nowait(message(ConnectionInMessageType.THROTTLE, "a", {"paused": True}))
+    inbox.put_nowait(message(ConnectionInMessageType.THROTTLE, "a", {"paused": False}))
+    assert inbox.stats.coalesced == 2
+    assert drain(inbox) == [
+        (ConnectionInMessageType.DELTA, "a", {"width": 80, "height": 24}),
+        (ConnectionInMessageType.DELTA, "b", {"width": 100}),
+        (ConnectionInMessageType.THROTTLE, "a", {"paused": False}),
+    ]
+    # an UPDATE absorbs a later DELTA, and nothing coalesces with a message already sent.
+    inbox.put_nowait(message(ConnectionInMessageType.UPDATE, "a"))
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"width": 90}))
+    assert drain(inbox) == [(ConnectionInMessageType.UPDATE, "a", None)]
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"width": 70}))
+    assert drain(inbox) == [(ConnectionInMessageType.DELTA, "a", {"width": 70})]
+
+
+def test_inbox_take_client():
+    inbox = LinkInbox()
+    inbox.put_nowait(line("a", "1"))
+    inbox.put_nowait(line("b", "1"))
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"width": 80}))
+    inbox.put_nowait(line("a", "2"))
+    taken = inbox.take_client("a")
+    assert [(msg.msg_type, msg.data) for msg in taken] == [
+        (ConnectionInMessageType.DELTA, {"width": 80}),
+        (ConnectionInMessageType.GAMEDATA, (("line", ("1",), dict()),)),
+        (ConnectionInMessageType.GAMEDATA, (("line", ("2",), dict()),)),
+    ]
+    assert len(inbox) == 1
+    # the taken DELTA no longer absorbs new ones.
+    inbox.put_nowait(message(ConnectionInMessageType.DELTA, "a", {"height": 24}))
+    assert [(msg_type, client_id) for msg_type, client_id, data in drain(inbox)] == [
+        (ConnectionInMessageType.DELTA, "a"),
+        (ConnectionInMessageType.GAMEDATA, "b"),
+    ]
+
+
+def connect_with_hello(manager: LinkManager, hello: dict, settle: int = 20):
+    """
+    Connects a StubWebSocket to the default link, answers its HELLO with hello, and returns
+    the websocket and the frames sent after the gateway's HELLO once things settle.
+    """
+    async def main():
+        ws = StubWebSocket()
+        task = asyncio.create_task(manager.handle_ws(ws, "/"))
+        await asyncio.wait_for(ws.wait_sent(1), 5)
+        ws.feed(1, hello)
+        for i in range(settle):
+            await asyncio.sleep(0)
+        task.cancel()
+        return ws.frames()[1:]
+
+    return asyncio.run(main())
+
+
+def recorded_manager(frames: int, **kwargs) -> LinkManager:
+    manager = make_manager(clients=1, **kwargs)
+    for i in range(frames):
+        manager.default.record([line("c0", str(i))])
+    return manager
+
+
+def test_replay_after_ack():
+    manager = recorded_manager(3)
+    sent = connect_with_hello(manager, {"ack": 1, "epoch": manager.epoch})
+    assert [frame["seq"] for frame in sent] == [2, 3]
+
+
+def test_stale_epoch_ack_gets_no_replay():
+    manager = recorded_manager(3)
+    assert connect_with_hello(manager, {"ack": 1, "epoch": "another boot"}) == []
+    # nor does it forget anything.
+    assert not manager.default.acknowledge(3, "another boot")
+    assert [seq for seq, msgs in manager.default.unacked] == [1, 2, 3]
+    assert manager.default.acknowledge(2, manager.epoch)
+    assert [seq for seq, msgs in manager.default.unacked] == [3]
+
+
+def test_replay_gap_sends_resync_hello():
+    manager = recorded_manager(5, replay_frames=2)
+    sent = connect_with_hello(manager, {"ack": 1, "epoch": manager.epoch})
+    assert [frame["msg_type"] for frame in sent] == [1]
+    data = sent[0]["data"]
+    assert data["resync"] and data["missing"] == [2, 3] and data["seq"] == 5
+    assert list(data["clients"]) == ["c0"]
+    assert not manager.default.unacked
@@ -0,0 +1,143 @@
+"""
+Tests for MudText's string API: each method must give the same text as the str method it
+mirrors, and keep every character's style.
+"""
+import random
+
+import pytest
+import ujson
+
+from mudgate.rich import MudStyle, MudText, intern_style
+
+RED = MudStyle(color="red")
+BOLD = MudStyle(bold=True)
+
+
+def styled(plain: str, styles: list) -> MudText:
+    text = MudText(plain)
+    for i, style in enumerate(styles):
+        if style:
+            text.stylize(style, i, i + 1)
+    return text
+
+
+def styles_of(text: MudText) -> list:
+    return [text.style_at_index(i) for i in range(len(text.plain))]
+
+
+def random_styled(rng: random.Random):
+    plain = "".join(rng.choice("ab  c.") for _ in range(rng.randint(0, 12)))
+    styles = [rng.choice((None, RED, BOLD)) for c in plain]
+    return plain, styles, styled(plain, styles)
+
+
+def null_or(style):
+    return style or MudStyle.null()
+
+
+@pytest.mark.parametrize("method", ["count", "startswith", "endswith", "find"])
+def test_delegates_to_plain(method):
+    text = styled("abcabc", [RED] * 6)
+    assert getattr(text, method)("bc") == getattr("abcabc", method)("bc")
+
+
+def test_predicates_match_str():
+    for plain in ("abc", "ABC", "123", "a b", "  ", "Title Case", "x1"):
+        text = MudText(plain)
+        for method in ("isalnum", "isalpha", "isdecimal", "isdigit", "isidentifier", "islower", "isnumeric",
+                       "isprintable", "isspace", "istitle", "isupper"):
+            assert getattr(text, method)() == getattr(plain, method)(), (plain, method)
+
+
+def test_capitalize_keeps_styles():
+    text = styled("abc", [RED, None, BOLD])
+    out = text.capitalize()
+    assert out.plain == "Abc"
+    assert styles_of(out) == styles_of(text)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_padding_matches_str(seed):
+    rng = random.Random(seed)
+    for trial in range(50):
+        plain, styles, text = random_styled(rng)
+        width = rng.randint(0, 20)
+        fill = rng.choice(" a-")
+        for method in ("center", "ljust", "rjust"):
+            out = getattr(text, method)(width, fill)
+            expected = getattr(plain, method)(width, fill)
+            assert out.plain == expected, (method, plain, width, fill)
+            if method == "center":
+                start = (len(expected) - len(plain)) // 2 + ((len(expected) - len(plain)) & width & 1)
+            elif method == "ljust":
+                start = 0
+            else:
+                start = len(expected) - len(plain)
+            assert styles_of(out)[start:start + len(plain)] == [null_or(s) for s in styles], (method, plain)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_strip_matches_str(seed):
+    rng = random.Random(seed)
+    for trial in range(50):
+        plain, styles, text = random_styled(rng)
+        for chars in (None, " ", " ."):
+            out = text.strip(chars)
+            assert out.plain == plain.strip(chars)
+            start = len(plain) - len(plain.lstrip(chars))
+            assert styles_of(out) == [null_or(s) for s in styles[start:start + len(out.plain)]]
+            assert text.lstrip(chars).plain == plain.lstrip(chars)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_replace_matches_str(seed):
+    rng = random.Random(seed)
+    for trial in range(50):
+        plain, styles, text = random_styled(rng)
+        old = rng.choice(("a", "b ", "c", "ab", "x", "."))
+        new = rng.choice(("", "Z", "ZZ", "ZZZ"))
+        count = rng.choice((-1, 0, 1, 2))
+        assert text.replace(old, new, count).plain == plain.replace(old, new, count), (plain, old, new, count)
+
+
+def test_replace_styles():
+    text = styled("abc", [None, RED, BOLD])
+    # the match ends at the end of the text, and the longer replacement takes c's style.
+    out = text.replace("c", "dd")
+    assert out.plain == "abdd"
+    assert styles_of(out) == [MudStyle.null(), RED, BOLD, BOLD]
+    out = text.replace("bc", "X")
+    assert out.plain == "aX"
+    assert styles_of(out) == [MudStyle.null(), RED]
+    assert text.replace("", "X").plain == "abc"
+
+
+def test_find_all():
+    text = MudText("abcabca")
+    assert text.find_all("a") == [0, 3, 6]
+    assert text.find_all("bc") == [1, 4]
+    assert text.find_all("z") == []
+    assert text.find_all("") == []
+
+
+def test_reverse_and_scramble_keep_each_characters_style():
+    text = styled("abcde", [RED, None, BOLD, RED, None])
+    pairs = list(zip(text.plain, styles_of(text)))
+    out = text.reverse()
+    assert list(zip(out.plain, styles_of(out))) == pairs[::-1]
+    random.seed(0)
+    out = text.scramble()
+    assert sorted(zip(out.plain, styles_of(out)), key=repr) == sorted(pairs, key=repr)
+
+
+def test_style_meta_survives_serialize():
+    clicked = MudStyle(color="red", meta={"@click": "look", "args": [1, 2]})
+    other = MudStyle(color="red", meta={"@click": "north"})
+    text = MudText("ab")
+    text.stylize(clicked, 0, 1)
+    text.stylize(other, 1, 2)
+    out = MudText.deserialize(ujson.loads(ujson.dumps(text.serialize())))
+    assert [s.meta for s in styles_of(out)] == [clicked.meta, other.meta]
+    # styles differing only in meta aren't interned together.
+    assert intern_style(clicked.serialize()) is not intern_style(other.serialize())
+    assert intern_style(clicked.serialize()) is intern_style(clicked.serialize())
@@ -0,0 +1,62 @@
+"""
+Property tests for MudText's run sweep: disassemble_runs must agree with style_at_index at
+every index, and assemble_bits must rebuild the same text from its output.
+"""
+import random
+
+import pytest
+from rich.text import Span
+
+from mudgate.rich import MudStyle, MudText
+
+STYLES = [MudStyle(color="red"), MudStyle(color="blue"), MudStyle(color="green"), MudStyle(bold=True),
+          MudStyle(tag="SEND", xml_attr={"href": "look"}), MudStyle.null(), None, "bold red"]
+
+
+def random_text(rng: random.Random) -> MudText:
+    length = rng.randint(0, 30)
+    text = MudText("".join(rng.choice("ab c") for _ in range(length)), style=rng.choice(STYLES) or "")
+    for i in range(rng.randint(0, 6)):
+        # spans may start before the text, end past it, or be empty.
+        start = rng.randint(-2, length + 2)
+        end = rng.randint(start, length + 3)
+        text._spans.append(Span(start, end, rng.choice(STYLES)))
+    return text
+
+
+def expected_styles(text: MudText) -> list:
+    return [text.style_at_index(i) for i in range(len(text.plain))]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_runs_match_style_at_index(seed):
+    rng = random.Random(seed)
+    for trial in range(200):
+        text = random_text(rng)
+        expected = expected_styles(text)
+        runs = text.disassemble_runs()
+        assert "".join(run for style, run in runs) == text.plain
+        styles = [style for style, run in runs for c in run]
+        assert styles == expected
+        assert [hash(s) for s in styles] == [hash(s) for s in expected]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bits_match_style_at_index(seed):
+    rng = random.Random(seed)
+    for trial in range(200):
+        text = random_text(rng)
+        bits = text.disassemble_bits()
+        assert [c for style, c in bits] == list(text.plain)
+        assert [style for style, c in bits] == expected_styles(text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_assemble_round_trip(seed):
+    rng = random.Random(seed)
+    for trial in range(200):
+        text = random_text(rng)
+        rebuilt = MudText.assemble_bits(text.disassemble_runs())
+        assert rebuilt.plain == text.plain
+        assert expected_styles(rebuilt) == expected_styles(text)
+        assert rebuilt.disassemble_runs() == text.disassemble_runs()
@@ -0,0 +1,129 @@
+"""
+MudConnection.render_xml_fast must produce exactly what printing render_xml_text() through
+Rich does, for every console it can be used with.
+"""
+import random
+from xml.etree import ElementTree
+
+import pytest
+from rich.color import ColorSystem
+
+from mudgate import rich as mudrich
+from mudgate.conn import MudConnection
+from mudgate.shared import ConnectionDetails
+
+# documents the fast path must handle itself.
+FAST_CORPUS = [
+    "<text>You see a goblin.</text>",
+    "<text color=\"red\">Blood drips from the ceiling.</text>",
+    "<text>You see a <span color=\"red\">goblin</span>.</text>",
+    "<text color=\"bright_white\" options=\"1\">The Market Square</text>",
+    "<text bgcolor=\"blue\">A <span color=\"#ff00aa\" options=\"5\">glowing</span> sword</text>",
+    "<text>Exits: <span color=\"green\" tag=\"SEND\" href=\"north\">north</span> "
+    "<span color=\"green\" tag=\"SEND\" href=\"east\">east</span></text>",
+    "<text color=\"color(200)\" bgcolor=\"black\">  &amp;<span color=\"red\">Room!</span></text>",
+    "<text color=\"red\">a<span color=\"none\">b</span>c<span options=\"8\" no_options=\"1\">d</span></text>",
+]
+
+# documents the fast path must hand over to Rich.
+RICH_CORPUS = [
+    "<text>tab\there</text>",
+    "<text>two\nlines</text>",
+    "<text>café</text>",
+    "<text>nested <span>a<span>b</span></span></text>",
+    "<text></text>",
+    "<text>Nothing <span color=\"yellow\"></span>between</text>",
+    "<text>" + "x" * 100 + "</text>",
+]
+
+CONSOLES = [
+    (color_system, mxp, pueblo, width)
+    for color_system in (None, ColorSystem.STANDARD, ColorSystem.EIGHT_BIT, ColorSystem.TRUECOLOR)
+    for mxp in (False, True)
+    for pueblo in (False, True)
+    for width in (20, 40, 78)
+]
+
+
+def generated_corpus(count: int = 200, seed: int = 3):
+    rng = random.Random(seed)
+    words = ["the", "goblin", "  ", "x", "a b", "Room!", "&amp;", "&lt;door&gt;"]
+
+    def attrs():
+        out = list()
+        if rng.random() < 0.5:
+            out.append(f'color="{rng.choice(["red", "blue", "#ff00aa", "color(200)", "none"])}"')
+        if rng.random() < 0.3:
+            out.append(f'bgcolor="{rng.choice(["green", "black"])}"')
+        if rng.random() < 0.3:
+            out.append(f'options="{rng.randint(0, 15)}"')
+        if rng.random() < 0.3:
+            out.append(f'tag="SEND" href="look {rng.randint(0, 3)}"')
+        return " " + " ".join(out) if out else ""
+
+    docs = list()
+    for i in range(count):
+        doc = f"<text{attrs()}>" + "".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        for s in range(rng.randint(0, 4)):
+            doc += f"<span{attrs()}>" + "".join(rng.choice(words) for _ in range(rng.randint(0, 3))) + "</span>"
+            doc += "".join(rng.choice(words) for _ in range(rng.randint(0, 2)))
+        docs.append(doc + "</text>")
+    return docs
+
+
+def make_connection(color_system, mxp: bool, pueblo: bool, width: int) -> MudConnection:
+    conn = MudConnection(ConnectionDetails(client_id="test"))
+    console = conn.console
+    console._color_system = color_system
+    console._mxp = mxp
+    console._pueblo = pueblo
+    console._width = width
+    return conn
+
+
+def render_rich(conn: MudConnection, doc: str) -> str:
+    return conn.print(conn.render_xml_text(ElementTree.fromstring(doc)))
+
+
+@pytest.mark.parametrize("color_system,mxp,pueblo,width", CONSOLES)
+def test_fast_corpus_matches_rich(color_system, mxp, pueblo, width):
+    conn = make_connection(color_system, mxp, pueblo, width)
+    for doc in FAST_CORPUS:
+        tree = ElementTree.fromstring(doc)
+        fast = conn.render_xml_fast(tree)
+        if len("".join(tree.itertext())) > width:
+            # too wide for this console, so it has to wrap.
+            assert fast is None, doc
+            continue
+        assert fast is not None, doc
+        assert fast == render_rich(conn, doc), doc
+
+
+@pytest.mark.parametrize("color_system,mxp,pueblo,width", CONSOLES)
+def test_generated_corpus_matches_rich(color_system, mxp, pueblo, width):
+    conn = make_connection(color_system, mxp, pueblo, width)
+    rendered = 0
+    for doc in generated_corpus():
+        fast = conn.render_xml_fast(ElementTree.fromstring(doc))
+        if fast is None:
+            continue
+        rendered += 1
+        assert fast == render_rich(conn, doc), doc
+    assert rendered
+
+
+@pytest.mark.parametrize("doc", RICH_CORPUS)
+def test_fast_path_declines(doc):
+    conn = make_connection(ColorSystem.TRUECOLOR, True, False, 78)
+    assert conn.render_xml_fast(ElementTree.fromstring(doc)) is None
+
+
+def test_linked_styles_skip_the_escape_cache():
+    mudrich._ESCAPE_CACHE.clear()
+    for i in range(10):
+        prefix, suffix = mudrich.MudStyle(color="red", link="https://example.com").escapes()
+        assert "https://example.com" in prefix
+    assert not mudrich._ESCAPE_CACHE
+    mudrich.MudStyle(color="red").escapes()
+    mudrich.MudStyle(color="red").escapes()
+    assert len(mudrich._ESCAPE_CACHE) == 1
@@ -0,0 +1,103 @@
+"""
+Tests for TelnetMudConnection over real loopback sockets.
+"""
+import asyncio
+import socket
+
+from mudgate.shared import ConnectionDetails
+from mudgate.telnet import TelnetMudConnection
+
+
+class StubApp:
+    def __init__(self):
+        self.game_clients = dict()
+
+
+class StubListener:
+    mccp2 = None
+    compress_threshold = 0
+    compress_executor = None
+    out_high = 16384
+    out_low = 4096
+    out_limit = 65536
+    read_size = 4096
+    read_max = 65536
+    read_shrink = 16
+
+    def __init__(self, policy: str):
+        self.out_policy = policy
+        self.app = StubApp()
+
+
+class QuietConnection(TelnetMudConnection):
+    """
+    Skips negotiation and the link, and records the events it would have queued.
+    """
+
+    def __init__(self, listener, details):
+        super().__init__(listener, details)
+        self.events = list()
+        self.lost = asyncio.Event()
+
+    async def run(self):
+        self.started = True
+
+    def queue_in_event(self, msg):
+        self.events.append(msg)
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        self.lost.set()
+
+
+async def stalled_client(policy: str):
+    """
+    Connects a client that never reads, then floods it with output.
+    """
+    loop = asyncio.get_running_loop()
+    listener = StubListener(policy)
+    conns = list()
+
+    def factory():
+        conn = QuietConnection(listener, ConnectionDetails(client_id="test"))
+        conns.append(conn)
+        return conn
+
+    server = await loop.create_server(factory, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(("127.0.0.1", port))
+    while not conns:
+        await asyncio.sleep(0.01)
+    conn = conns[0]
+    conn.transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    await asyncio.sleep(0.01)
+    for i in range(500):
+        await conn.send_text_data("line", "x" * 1000)
+        await asyncio.sleep(0)
+    return server, sock, conn
+
+
+def test_disconnect_policy_drops_stalled_client():
+    async def main():
+        server, sock, conn = await stalled_client("disconnect")
+        await asyncio.wait_for(conn.lost.wait(), 2)
+        assert not conn.out_held
+        sock.close()
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_pause_policy_holds_up_to_limit():
+    async def main():
+        server, sock, conn = await stalled_client("pause")
+        assert conn.reading_paused
+        assert 0 < conn.out_stats.held_bytes <= StubListener.out_limit
+        assert conn.out_stats.dropped_bytes
+        assert not conn.transport.is_closing()
+        sock.close()
+        server.close()
+
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+TelnetFrameScanner and TelnetConnection.process_buffer must parse exactly what consuming a
+buffer one frame at a time with TelnetFrame.parse_consume does, however the input is split.
+"""
+import random
+
+import pytest
+
+from mudgate.telnet_protocol import TC, TelnetConnection, TelnetFrame, TelnetFrameScanner, TelnetFrameType
+from mudgate.telnet_protocol import _InternalMsg
+
+
+def random_input(rng: random.Random) -> bytes:
+    pieces = [
+        lambda: bytes(rng.choice(b"look north\r\nsay hi") for _ in range(rng.randint(1, 20))),
+        lambda: b"\r\n",
+        lambda: bytes([TC.IAC, TC.IAC]),
+        lambda: bytes([TC.IAC, rng.choice((TC.WILL, TC.WONT, TC.DO, TC.DONT)),
+                       rng.choice((TC.SGA, TC.NAWS, TC.MTTS, TC.MXP, TC.MCCP2, 200))]),
+        lambda: bytes([TC.IAC, TC.SB, TC.NAWS, 0, rng.randint(0, 255), 0, rng.randint(0, 255), TC.IAC, TC.SE]),
+        lambda: bytes([TC.IAC, TC.SB, TC.MTTS, 0]) + rng.choice((b"MUDLET", b"TINTIN", b"XTERM")) + bytes(
+            [TC.IAC, TC.SE]),
+        lambda: bytes([TC.IAC, TC.NOP]),
+        lambda: bytes(rng.randint(0, 255) for _ in range(rng.randint(1, 4))),
+    ]
+    return b"".join(rng.choice(pieces)() for _ in range(rng.randint(0, 40)))
+
+
+def random_chunks(rng: random.Random, data: bytes) -> list:
+    chunks = list()
+    while data:
+        size = rng.randint(1, 12)
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks
+
+
+def frame_key(frame: TelnetFrame):
+    data = frame.data
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return frame.msg_type, data
+
+
+def reference_frames(data: bytes) -> list:
+    buffer = bytearray(data)
+    frames = list()
+    while (frame := TelnetFrame.parse_consume(buffer)):
+        frames.append(frame_key(frame))
+    return frames
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_scanner_matches_parse_consume(seed):
+    rng = random.Random(seed)
+    data = random_input(rng)
+    scanner = TelnetFrameScanner()
+    frames = list()
+    for chunk in random_chunks(rng, data):
+        scanner.feed(chunk)
+        frames.extend(frame_key(frame) for frame in scanner)
+    # DATA split across chunks comes out as several frames, so compare with those joined.
+    assert join_data(frames) == join_data(reference_frames(data))
+
+
+def join_data(frames: list) -> list:
+    out = list()
+    for msg_type, data in frames:
+        if msg_type == TelnetFrameType.DATA and out and out[-1][0] == TelnetFrameType.DATA:
+            out[-1] = (msg_type, out[-1][1] + data)
+        else:
+            out.append((msg_type, data))
+    return out
+
+
+def merge_changed(into: dict, changed: dict):
+    for key, value in changed.items():
+        into.setdefault(key, dict()).update(value)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_process_buffer_matches_frame_at_a_time(seed):
+    rng = random.Random(seed)
+    data = random_input(rng)
+
+    old = TelnetConnection()
+    old.start(bytearray())
+    old_out = bytearray()
+    imsg = _InternalMsg(old, old_out, list())
+    buffer = bytearray(data)
+    while (frame := TelnetFrame.parse_consume(buffer)):
+        old._process_frame(frame, imsg)
+    old_changed = dict()
+    merge_changed(old_changed, imsg.changed)
+
+    new = TelnetConnection()
+    new.start(bytearray())
+    new_out = bytearray()
+    new_events = list()
+    new_changed = dict()
+    scanner = TelnetFrameScanner()
+    for chunk in random_chunks(rng, data):
+        scanner.feed(chunk)
+        out, events, changed = new.process_buffer(scanner)
+        new_out.extend(out)
+        new_events.extend(events)
+        merge_changed(new_changed, changed)
+
+    assert new_out == old_out
+    assert [(e.msg_type, bytes(e.data)) for e in new_events] == [(e.msg_type, bytes(e.data)) for e in
+                                                                  imsg.out_events]
+    assert new_changed == old_changed
+    assert new.cmdbuff == old.cmdbuff
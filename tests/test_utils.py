@@ -0,0 +1,38 @@
+"""
+Tests for the ID generator and its base 62 encoding.
+"""
+import re
+
+from mudgate.utils import BASE62, IdGenerator, encode_base62
+
+
+def decode_base62(text: str) -> int:
+    number = 0
+    for c in text:
+        number = number * 62 + BASE62.index(c)
+    return number
+
+
+def test_encode_base62():
+    assert encode_base62(0) == "0"
+    assert encode_base62(61) == BASE62[-1]
+    assert encode_base62(62) == "10"
+    assert encode_base62(5, 4) == "0005"
+    for number in (1, 999, 62 ** 6 - 1, 2 ** 64):
+        assert decode_base62(encode_base62(number)) == number
+
+
+def test_ids_are_unique_and_well_formed():
+    ids = IdGenerator(worker=3)
+    assert len(ids.nonce) == 12
+    assert decode_base62(ids.nonce[6:8]) == 3
+    generated = [ids.generate("telnet") for i in range(10000)]
+    assert len(set(generated)) == len(generated)
+    pattern = re.compile(f"telnet_{ids.nonce}[0-9A-Za-z]+")
+    assert all(pattern.fullmatch(client_id) for client_id in generated)
+
+
+def test_ids_differ_across_workers_and_boots():
+    first, second, other = IdGenerator(), IdGenerator(), IdGenerator(worker=1)
+    assert len({first.nonce, second.nonce, other.nonce}) == 3
+    assert first.generate("telnet") != second.generate("telnet")